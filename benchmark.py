@@ -0,0 +1,162 @@
+#
+# Timings for the simulator's hot spots, e.g.:
+#
+#     python benchmark.py overlap
+#
+import sys,time,math
+from random import *
+import critters
+import narrowphase
+from geo2d.geometry import *
+
+def timed(f,*args):
+    start = time.perf_counter()
+    result = f(*args)
+    return time.perf_counter()-start,result
+
+def sample_shapes(world,count):
+    # Critter, Block and GoldStar outlines, as the collision pass sees them
+    shapes = []
+    for i in range(0,count):
+        kind = i % 3
+        if kind == 0:
+            o = critters.Critter(world,critters.CritterBrain,"b{}".format(i))
+            o.mass = uniform(5,60)
+        elif kind == 1:
+            o = critters.Block(world,world.random_location(),uniform(1,10),uniform(1,10),critters.Heading(uniform(0,2*math.pi)))
+        else:
+            o = critters.GoldStar(world,world.random_location())
+        shapes.append(o)
+    return shapes
+
+def glancing_pairs(shapes,count):
+    # Pairs placed so their radii overlap but their cores don't; these are the
+    #   only ones that get as far as the narrow phase.
+    pairs = []
+    while len(pairs) < count:
+        a,b = choice(shapes),choice(shapes)
+        if a is b: continue
+        ra,rb = a.radius(),b.radius()
+        d = uniform(a.core_radius()+b.core_radius(),ra+rb)
+        phi = uniform(0,2*math.pi)
+        b.location = Point(a.location.x+d*math.cos(phi),a.location.y+d*math.sin(phi))
+        pairs.append((a.outline(),b.outline(),a.location,b.location,ra,rb))
+    return pairs
+
+def overlap(poly1,poly2,c1=None,c2=None,r1=None,r2=None):
+    # The simulator's overlap test from before the narrow phase, kept here
+    #   so there's something to compare the narrow phase with
+    b1 = poly1.bounding_box
+    b2 = poly2.bounding_box
+    c1 = c1 or poly1.centroid
+    c2 = c2 or poly2.centroid
+    r1 = r1 or poly1.diameter
+    r2 = r2 or poly2.diameter
+    d = r1+r2
+    c = Point((r1*c1.x+r2*c2.x)/d,(r1*c1.y+r2*c2.y)/d)
+    # This isn't the right value for o -- the real overlap is lense shaped.
+    o = d - c1.distance_to(c2)
+    if o < 0 or b1.left > b2.right or b1.right < b2.left or b1.top < b2.bottom or b1.bottom > b2.top:
+        return False
+    for p1 in poly1.vertices:
+        if c.distance_to(p1) < o and poly2.has(p1):
+            return True
+    for p2 in poly2.vertices:
+        if c.distance_to(p2) < o and poly1.has(p2):
+            return True
+    e2_near_edges = [e for e in poly2.edges if c.distance_to(e) < o and e.length > 0]
+    for e1 in poly1.edges:
+        if c.distance_to(e1) < o and e1.length > 0:
+            for e2 in e2_near_edges:
+                if e1.intersection(e2):
+                    return True
+    return False
+
+def bench_overlap(count=2000):
+    w = critters.World(headless=True,free_run=True)
+    pairs = glancing_pairs(sample_shapes(w,30),count)
+    build_old,polys  = timed(lambda: [(Polygon(p),Polygon(q)) for p,q,c1,c2,r1,r2 in pairs])
+    build_new,shapes = timed(lambda: [(narrowphase.Shape(p),narrowphase.Shape(q)) for p,q,c1,c2,r1,r2 in pairs])
+    test_old,old = timed(lambda: [overlap(p1,p2,c1=pair[2],c2=pair[3],r1=pair[4],r2=pair[5]) for (p1,p2),pair in zip(polys,pairs)])
+    test_new,new = timed(lambda: [narrowphase.overlap(s1,s2) for s1,s2 in shapes])
+    print("Narrow phase on {} glancing Critter/Block/GoldStar pairs".format(count))
+    print("                    shape setup     overlap test   (microseconds per pair)")
+    print("    polygon overlap     %8.1f        %8.1f" % (1e6*build_old/count,1e6*test_old/count))
+    print("    narrowphase         %8.1f        %8.1f" % (1e6*build_new/count,1e6*test_new/count))
+    print("    speedup             %8.1fx       %8.1fx" % (build_old/build_new,test_old/test_new))
+    print("    hits: old %d, new %d, disagreements %d" % (sum(old),sum(new),sum(a != b for a,b in zip(old,new))))
+
+def sight_at(sights,angle):
+    # The distance seen at a given angle (None if nothing covers it)
+    for s in sights:
+        if s.direction-s.width/2 <= angle < s.direction+s.width/2:
+            return s.distance
+    return None
+
+def bench_sight(critter_count=40,ticks=20,samples=200):
+    if not critters.Brains.available: critters.load_brains()
+    seed(1)
+    w = critters.build_world(critters.Config(headless=True,free_run=True,critters=critter_count,seed=1))
+    w.step(ticks)
+    viewers = [c for c in w.critters if not c.dead]
+    spans = [(c,c.sight_candidates()) for c in viewers]
+    angles = [-1+2*(i+0.5)/samples for i in range(0,samples)]
+    exact_time,exact = timed(lambda: [c.exact_sight(s) for c,s in spans])
+    exact_seen = [[sight_at(sights,a) for a in angles] for sights in exact]
+    print("Sight for {} critters ({:.1f} candidate objects each)".format(len(viewers),sum(len(s) for c,s in spans)/len(spans)))
+    print("                       us per critter   angles matching exact")
+    print("    exact intervals    %10.1f" % (1e6*exact_time/len(spans)))
+    for bins in [30,60,120,240,480]:
+        binned_time,binned = timed(lambda: [c.binned_sight(s,bins) for c,s in spans])
+        matches = sum(sight_at(sights,a) == seen for sights,row in zip(binned,exact_seen) for a,seen in zip(angles,row))
+        print("    %4d bins          %10.1f         %5.1f%%" % (bins,1e6*binned_time/len(spans),100.0*matches/(len(spans)*samples)))
+
+def bench_batch_sight(critter_count=200,ticks=20):
+    if not critters.Brains.available: critters.load_brains()
+    w = critters.build_world(critters.Config(headless=True,free_run=True,critters=critter_count,seed=1,array_physics=True))
+    w.step(ticks)
+    viewers = [c for c in w.critters if not c.dead]
+    # Once untimed, so both start with the wall visibility worked out
+    [c.sight_candidates() for c in viewers]
+    single_time,single = timed(lambda: [c.sight_candidates() for c in viewers])
+    batch_time,batch = timed(w.batch_sight,viewers)
+    def same(s1,s2):
+        key = lambda span: span[3].serial
+        return len(s1) == len(s2) and all(a[3] is b[3] and max(abs(a[i]-b[i]) for i in range(0,3)) < 1e-9 for a,b in zip(sorted(s1,key=key),sorted(s2,key=key)))
+    print("Sight candidates for {} critters ({:.1f} each)".format(len(viewers),sum(len(s) for s in single)/len(viewers)))
+    print("                       us per critter")
+    print("    one at a time      %10.1f" % (1e6*single_time/len(viewers)))
+    print("    batched            %10.1f" % (1e6*batch_time/len(viewers)))
+    print("    critters whose candidates differ: %d" % sum(not same(s,batch[c]) for c,s in zip(viewers,single)))
+
+def bench_act(count=20000):
+    w = critters.World(headless=True,free_run=True)
+    c = critters.Critter(w,critters.CritterBrain,"act")
+    c.teleport_to(w,w.random_location())
+    c.heading = critters.Heading(0,1)
+    turns = [uniform(-0.5,0.5) for i in range(0,count)]
+    def run(commands):
+        c.mass = 1e9
+        for cmd in commands: c.act(cmd)
+    modes = [
+        ("strings",        lambda: run(["Turn {}".format(x) if i % 3 else "Pass" for i,x in enumerate(turns)])),
+        ("repeated strings", lambda: run(["Turn {:.1f}".format(x) if i % 3 else "Pass" for i,x in enumerate(turns)])),
+        ("tuples",         lambda: run([(critters.TURN,x) if i % 3 else (critters.PASS,) for i,x in enumerate(turns)])),
+        ]
+    print("Critter.act on {} commands (two thirds Turn, the rest Pass), counting the brain's formatting".format(count))
+    print("                          us per command")
+    for name,f in modes:
+        critters.parse_command.cache_clear()
+        t,result = timed(f)
+        print("    %-18s   %10.2f" % (name,1e6*t/count))
+
+benchmarks = {
+    'overlap': bench_overlap,
+    'sight':   bench_sight,
+    'batch_sight': bench_batch_sight,
+    'act':     bench_act,
+    }
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or sorted(benchmarks):
+        benchmarks[name]()
@@ -0,0 +1,160 @@
+#
+#
+import multiprocessing,time,traceback,atexit
+
+class BrainHost:
+    # Runs each brain file's brains in a worker process of its own, so that a
+    #   brain which crashes, hangs or eats all the memory only takes its own
+    #   team down, and different teams can think at the same time.  Each tick
+    #   a team's critters all go over in one batch and their commands all
+    #   come back in one reply; a team that doesn't answer in time is cut off.
+    def __init__(self,seed=None,timeout=1.0,load_timeout=30.0):
+        self.context = multiprocessing.get_context('spawn')
+        self.seed = seed
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self.workers = {}
+        atexit.register(self.close)
+    def start(self,files):
+        # Start all the workers at once, then wait for each to load its file
+        for file in files:
+            if not file in self.workers:
+                ours,theirs = self.context.Pipe()
+                process = self.context.Process(target=serve,args=(theirs,file,self.seed),daemon=True)
+                process.start()
+                theirs.close()
+                self.workers[file] = (process,ours)
+        for file in files:
+            if self.workers[file] and not self.receive(file,self.load_timeout):
+                self.give_up(file,"didn't load")
+    def receive(self,file,timeout):
+        process,conn = self.workers[file]
+        try:
+            if conn.poll(timeout):
+                return conn.recv()
+        except (EOFError,OSError):
+            pass
+        return None
+    def send(self,file,request):
+        if not self.workers.get(file): return False
+        try:
+            self.workers[file][1].send(request)
+            return True
+        except (BrokenPipeError,OSError):
+            self.give_up(file,"went away")
+            return False
+    def give_up(self,file,why):
+        process,conn = self.workers[file]
+        self.workers[file] = None
+        process.terminate()
+        print("Brains from {} {}; its critters are out of the game".format(file,why))
+    def think(self,batches):
+        # {file:[(name,brain name,packed senses),...]} -> {file:[(ok,command,wall,cpu),...] or None}
+        sent = [file for file,batch in batches.items() if self.send(file,('tick',batch))]
+        deadline = time.monotonic()+self.timeout
+        replies = {file:None for file in batches}
+        for file in sent:
+            replies[file] = self.receive(file,max(0.0,deadline-time.monotonic()))
+            if replies[file] is None:
+                self.give_up(file,"didn't answer in time")
+        return replies
+    def collide(self,file,request):
+        # One on_collision call, which can't wait for the next batch
+        if self.send(file,('collision',request)):
+            reply = self.receive(file,self.timeout)
+            if reply is not None:
+                return reply
+            self.give_up(file,"didn't answer in time")
+        return None
+    def close(self):
+        workers = [worker for worker in self.workers.values() if worker]
+        self.workers = {}
+        for process,conn in workers:
+            try:
+                conn.send(('stop',))
+            except (BrokenPipeError,OSError):
+                pass
+        for process,conn in workers:
+            process.join(0.5)
+            if process.is_alive(): process.terminate()
+
+def serve(conn,file,seed):
+    # The worker's end: load the brains from one file, say so, and then
+    #   answer requests until told to stop or the simulator goes away.
+    import critters
+    critters.load_brains([file])
+    classes = {b.__name__:b for b in critters.Brains.available}
+    streams = critters.Streams(seed)
+    brains = {}
+    batch_streams = {}
+    def plain(command):
+        # Plain tuples, so the other end needn't import whatever made them
+        return tuple(command) if isinstance(command,tuple) else command
+    def ask(name,brain_name,callback,*args):
+        command,ok = None,False
+        wall,cpu = time.perf_counter(),time.process_time()
+        if not name in brains and brain_name in classes:
+            brains[name] = (classes[brain_name](),streams.brain(name))
+        if name in brains:
+            brain,rng = brains[name]
+            previous = critters.Streams.use(rng)
+            try:
+                command,ok = getattr(brain,callback)(*args),True
+            except Exception:
+                traceback.print_exc(limit=3)
+            finally:
+                critters.Streams.use(previous)
+        return (ok,plain(command),time.perf_counter()-wall,time.process_time()-cpu)
+    def ask_batch(brain_class,team):
+        # One on_tick_batch call for team, a list of (name,packed senses),
+        #   with the time it takes split evenly between them as in the
+        #   simulator
+        for name,senses in team:
+            if not name in brains:
+                brains[name] = (brain_class(),streams.brain(name))
+        if not brain_class in batch_streams:
+            batch_streams[brain_class] = streams.brain("{}:{}".format(brain_class.owner,brain_class.__name__))
+        commands,ok = [None]*len(team),False
+        wall,cpu = time.perf_counter(),time.process_time()
+        previous = critters.Streams.use(batch_streams[brain_class])
+        try:
+            columns = critters.SenseColumns([brains[name][0] for name,senses in team],[critters.unpack_senses(senses) for name,senses in team])
+            decided = list(brain_class.on_tick_batch(columns))
+            if len(decided) != len(team):
+                raise ValueError("{}.on_tick_batch gave {} commands for {} critters".format(brain_class.__name__,len(decided),len(team)))
+            commands,ok = decided,True
+        except Exception:
+            traceback.print_exc(limit=3)
+        finally:
+            critters.Streams.use(previous)
+        wall,cpu = (time.perf_counter()-wall)/len(team),(time.process_time()-cpu)/len(team)
+        return [(ok,plain(command),wall,cpu) for command in commands]
+    def tick(batch):
+        # Brain classes with an on_tick_batch decide for all of their
+        #   critters at once, as they would in the simulator; the rest are
+        #   asked one critter at a time
+        replies = [None]*len(batch)
+        teams = {}
+        for i,(name,brain_name,senses) in enumerate(batch):
+            brain_class = classes.get(brain_name)
+            if brain_class is not None and brain_class.on_tick_batch:
+                teams.setdefault(brain_class,[]).append(i)
+            else:
+                replies[i] = ask(name,brain_name,'on_tick',critters.unpack_senses(senses))
+        for brain_class,team in teams.items():
+            for i,reply in zip(team,ask_batch(brain_class,[(batch[i][0],batch[i][2]) for i in team])):
+                replies[i] = reply
+        return replies
+    conn.send(sorted(classes))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request[0] == 'tick':
+            conn.send(tick(request[1]))
+        elif request[0] == 'collision':
+            name,brain_name,dir,other,senses = request[1]
+            conn.send(ask(name,brain_name,'on_collision',critters.Vector(*dir),critters.stand_in(*other),critters.unpack_senses(senses)))
+        else:
+            break
@@ -0,0 +1,40 @@
+#
+#
+def overlaps_modulo(low1,high1,low2,high2,span):
+    # Do two intervals overlap on a circle of the given circumference?
+    for shift in (0,span,-span):
+        if low1 < high2+shift and low2+shift < high1:
+            return True
+    return False
+
+def sweep_and_prune(boxes,width,height,movable=None):
+    # Given a list of (left,bottom,right,top) boxes on a width x height torus,
+    #   returns the set of index pairs (i,j), i < j, whose boxes overlap.
+    #   Boxes that hang over the left or right seam are swept a second time
+    #   from the other side; the y test is done modulo the height.  If
+    #   movable is given, pairs where neither box can move are left out.
+    entries = []
+    for i,(left,bottom,right,top) in enumerate(boxes):
+        entries.append((left,right,i))
+        if left < 0:       entries.append((left+width,right+width,i))
+        if right > width:  entries.append((left-width,right-width,i))
+    entries.sort()
+    pairs = set()
+    active = []
+    for left,right,i in entries:
+        active = [a for a in active if a[1] > left]
+        bottom,top = boxes[i][1],boxes[i][3]
+        for a_left,a_right,j in active:
+            if j != i and (movable is None or movable[i] or movable[j]) and overlaps_modulo(bottom,top,boxes[j][1],boxes[j][3],height):
+                pairs.add((i,j) if i < j else (j,i))
+        active.append((left,right,i))
+    return pairs
+
+assert overlaps_modulo(0,2,1,3,10)
+assert not overlaps_modulo(0,2,3,4,10)
+assert overlaps_modulo(-1,1,9,9.5,10)
+assert sweep_and_prune([(0,0,2,2),(1,1,3,3),(5,5,6,6)],10,10) == {(0,1)}
+assert sweep_and_prune([(-1,0,1,1),(9.5,0.5,10.5,2)],10,10) == {(0,1)}
+assert sweep_and_prune([(1,-1,2,1),(1.5,9.5,3,10.5)],10,10) == {(0,1)}
+assert sweep_and_prune([(0,0,1,1),(2,0,3,1)],10,10) == set()
+assert sweep_and_prune([(0,0,2,2),(1,1,3,3),(1,1,2,2)],10,10,[False,False,True]) == {(0,2),(1,2)}
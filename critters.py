@@ -1,13 +1,90 @@
 import argparse
 from random import *
+import random as _random
 import math
 from geo2d.geometry import *
 import itertools
+import functools
+import heapq
 from tkinter import *
 import time
 from intervalset import AngularIntervalSet,odd
+from spatialgrid import SpatialGrid
+from broadphase import sweep_and_prune
+import narrowphase
+from depthbuffer import depth_buffer
+from visibility import VisibilityIndex
+from brainhost import BrainHost
 import sys,traceback
+import atexit
+import glob,os,re
+import hashlib,marshal
 from collections import namedtuple
+from collections.abc import Mapping
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Streams:
+    # Independent random number streams for world generation, physics,
+    #   rendering and each critter's brain, so that a seeded run plays out
+    #   the same way every time.  Unseeded, they're all just the random
+    #   module, as before.  The uniform(), randrange() etc. used here (and
+    #   by the brains) draw from whichever stream is active.
+    active = _random
+    def __init__(self,seed=None):
+        self.seed = seed
+        if seed is None:
+            self.world = self.physics = self.render = _random
+        else:
+            self.world   = Random("{}:world".format(seed))
+            self.physics = Random("{}:physics".format(seed))
+            self.render  = Random("{}:render".format(seed))
+    def brain(self,name):
+        return _random if self.seed is None else Random("{}:brain:{}".format(self.seed,name))
+    def use(stream):
+        previous = Streams.active
+        Streams.active = stream
+        return previous
+
+def from_active_stream(name):
+    def draw(*args,**kwargs):
+        return getattr(Streams.active,name)(*args,**kwargs)
+    draw.__name__ = name
+    return draw
+
+# Everything "from random import *" gave us (random(), uniform(), sample(),
+#   seed(), ...) now goes to the active stream instead of the global one.
+for name in _random.__all__:
+    if not name in ('Random','SystemRandom'):
+        globals()[name] = from_active_stream(name)
+del name
+
+def by_serial(obj):
+    return obj.serial
+
+def sense_order(item):
+    # For sorting things brains sense that aren't comparable as they are
+    #   (the classes in taste and smell)
+    if isinstance(item,type): return item.__name__
+    if isinstance(item,tuple): return tuple(sense_order(x) for x in item)
+    return item
+
+class SenseSet(set):
+    # A set that always iterates in sorted order, so a brain looping over
+    #   (or taking the min of) what it senses does the same thing on every
+    #   run, whatever the hash seed.
+    def __iter__(self):
+        items = list(set.__iter__(self))
+        try:
+            items.sort()
+        except TypeError:
+            try:
+                items.sort(key=sense_order)
+            except TypeError:
+                items.sort(key=repr)
+        return iter(items)
 
 def random_color():
     return "#%02x%02x%02x" % (randrange(0,255),randrange(0,255),randrange(0,255))
@@ -18,40 +95,45 @@ def as_color(r,g,b):
 def gray(x):
     return as_color(x,x,x)
 
+def sight_color(obj):
+    return obj.color['outline'] if 'outline' in obj.color else obj.color['fill']
+
+class Crowd:
+    # Far away things lumped together by level-of-detail sight.  It looks
+    #   like its nearest member, and a crowd in the same place next tick
+    #   counts as the same crowd (so Sight.change still makes sense).
+    __slots__ = ('key','color','count','distance','serial')
+    def __init__(self,key,obj,dist):
+        self.key      = key
+        self.color    = obj.color
+        self.count    = 1
+        self.distance = dist
+        self.serial   = obj.serial
+    def add(self,obj,dist):
+        self.count += 1
+        if (dist,obj.serial) < (self.distance,self.serial):
+            self.color,self.distance,self.serial = obj.color,dist,obj.serial
+    def __eq__(self,other):
+        return isinstance(other,Crowd) and self.key == other.key
+    def __hash__(self):
+        return hash(self.key)
+
+def seen_as(obj,*sight):
+    # A crowd is seen with a count on the end; everything else is seen as
+    #   the usual five-field Sight
+    if isinstance(obj,Crowd):
+        return Critter.CrowdSight(*sight,obj.count)
+    return Critter.Sight(*sight)
+
 def Heading(dir,rho=None):
     return Vector(rho or 1.0,dir,coordinates="polar")
 
-def overlap(poly1,poly2,c1=None,c2=None,r1=None,r2=None):
-    b1 = poly1.bounding_box
-    b2 = poly2.bounding_box
-    c1 = c1 or poly1.centroid
-    c2 = c2 or poly1.centroid
-    r1 = r1 or poly1.diameter
-    r2 = r2 or poly2.diameter
-    d = r1+r2
-    c = Point((r1*c1.x+r2*c2.x)/d,(r1*c1.y+r2*c2.y)/d)
-    # This isn't the right value for o -- the real overlap is lense shaped.
-    o = d - c1.distance_to(c2)
-    if o < 0 or b1.left > b2.right or b1.right < b2.left or b1.top < b2.bottom or b1.bottom > b2.top:
-        return False
-    for p1 in poly1.vertices:
-        if c.distance_to(p1) < o and poly2.has(p1):
-            return True
-    for p2 in poly2.vertices:
-        if c.distance_to(p2) < o and poly1.has(p2):
-            return True
-    e2_near_edges = [e for e in poly2.edges if c.distance_to(e) < o and e.length > 0]
-    for e1 in poly1.edges:
-        if c.distance_to(e1) < o and e1.length > 0:
-            for e2 in e2_near_edges:
-                if e1.intersection(e2):
-                    return True
-    return False
-
 class DisplayObject:
     def __init__(self,world,loc):
         self.world = world
         self.location = loc
+        # A stable ordering, for places where set order would leak into the results
+        self.serial = next(world.serials)
     def on_tick(self):
         pass
     def draw(self, canvas,s):
@@ -85,6 +167,8 @@ class Sound(DisplayObject):
         self.faded  = False
     def on_tick(self):
         self.age += 1
+        # Fade even when nobody is drawing us (e.g. headless runs)
+        if self.age >= self.volume: self.faded = True
     def draw(self, canvas, s):
         self.remove_image(canvas)
         if self.age < self.volume:
@@ -101,8 +185,36 @@ class Sound(DisplayObject):
         else:
             self.faded = True
 
+class Geometry:
+    # Where an object's shape is in the world; each part is only worked
+    #   out when someone first asks for it.
+    def __init__(self,obj):
+        self.obj = obj
+        self._radius = self._core_radius = None
+        self._outline = self._bounding_box = self._shape = None
+    def radius(self):
+        if self._radius is None: self._radius = self.obj.radius()
+        return self._radius
+    def core_radius(self):
+        if self._core_radius is None: self._core_radius = self.obj.core_radius()
+        return self._core_radius
+    def outline(self):
+        if self._outline is None: self._outline = self.obj.outline()
+        return self._outline
+    def shape(self):
+        # The flattened outline the narrow phase works with
+        if self._shape is None: self._shape = narrowphase.Shape(self.outline())
+        return self._shape
+    def bounding_box(self):
+        # (left, bottom, right, top), in world coordinates
+        if self._bounding_box is None:
+            s = self.shape()
+            self._bounding_box = (s.left,s.bottom,s.right,s.top)
+        return self._bounding_box
+
 class PhysicalObject(DisplayObject):
     collision_cost    = 10
+    geometry_cache    = None
     def __init__(self,world,loc):
         DisplayObject.__init__(self,world,loc)
         self.tk_ids = {}
@@ -114,12 +226,23 @@ class PhysicalObject(DisplayObject):
         self.goal = False
         self.anchored = False
         self.floor_mat = False
+        self.asleep = False
+        self.last_hit = None
     def dump_status(self):
         print(self.location)
     def on_collision(self,dir,other):
         pass
     def on_damage(self,amount):
         pass
+    def geometry(self):
+        # Anchored things keep theirs until they tell us it's changed
+        if not self.anchored:
+            return Geometry(self)
+        if self.geometry_cache is None:
+            self.geometry_cache = Geometry(self)
+        return self.geometry_cache
+    def geometry_changed(self):
+        self.geometry_cache = None
     def radius(self):
         return 1
     def core_radius(self):
@@ -173,7 +296,7 @@ class Block(PhysicalObject):
     def create_image(self,canvas):
         self.tk_ids = { 'body':  canvas.create_polygon(1,1,**self.color) }
     def place_image(self,canvas,s):
-        self.place_image_part('body', canvas,s,*[coord for p in self.outline() for coord in p])
+        self.place_image_part('body', canvas,s,*[coord for p in self.geometry().outline() for coord in p])
     def draw(self, canvas,s):
         if self.dead:
             self.remove_image(canvas)
@@ -188,11 +311,17 @@ class Secretion(DisplayObject):
     undrawn = []
     dead = set()
     resized = set()
+    def reset():
+        Secretion.trails = []
+        Secretion.undrawn = []
+        Secretion.dead = set()
+        Secretion.resized = set()
     def __init__(self,world,loc):
         DisplayObject.__init__(self,world,loc)
         self.size = 2
         self.tk_id = None
         Secretion.undrawn.append(self)
+        if world.smells: world.smells.deposit(Secretion,loc,SmellField.secretion_strength)
     def on_tick():
         for t in range(0,100):
             i = randrange(0,1000)
@@ -217,20 +346,138 @@ class Secretion(DisplayObject):
         Secretion.dead.clear()
         Secretion.resized.clear()
 
+# Brains can return commands as strings ("Turn 0.3"), or as tuples with the
+#   argument (if any) already in place: (TURN,0.3), Command(EAT), etc.
+STOP,GO,TURN,ACCELERATE,ATTACK,EAT,PASS,SECRETE,SAY = "Stop","Go","Turn","Accelerate","Attack","Eat","Pass","Secrete","Say"
+Command = namedtuple("Command", "verb arg", defaults=(None,))
+
+numeric_commands = frozenset([TURN,ACCELERATE])
+
+@functools.lru_cache(maxsize=4096)
+def parse_command(text):
+    # "Turn 0.3" -> (TURN,0.3); remembered, since brains say the same few things a lot
+    word = text.split()
+    if not word:
+        return (None,None)
+    if word[0] == SAY:
+        return (SAY,text[4:])
+    arg = word[1] if len(word) > 1 else None
+    if word[0] in numeric_commands and arg is not None:
+        arg = float(arg)
+    return (word[0],arg)
+
+class Senses(Mapping):
+    # What a critter can sense this tick, looked up like a dictionary.  Each
+    #   organ is only worked out the first time the brain asks for it and is
+    #   then remembered for the rest of the tick; the world counts how often
+    #   each one actually gets computed.  Every critter has two of these,
+    #   used in turn, and the sets in them are emptied and refilled in place
+    #   rather than made anew; so a brain can compare with last tick's
+    #   senses, but needs to copy anything it wants to keep for longer.
+    __slots__ = ('critter','tick','done','sight','smell','hearing','taste','body','gps','compass')
+    organs = {
+        'sight':   'sight',         # set of tuples: (color,distance,direction,width,change)
+        'smell':   'sense_smell',   # set of tuples: (smell,strength,change)
+        'hearing': 'sense_hearing', # set of tuples: (text,direction,volume,age)
+        'taste':   'sense_taste',   # set of types
+        'body':    'sense_body',    # (moving,speed,health,age)
+        'gps':     'sense_gps',
+        'compass': 'sense_compass',
+        }
+    # The organs whose findings are sets, which get filled in rather than returned
+    collections = frozenset(['sight','smell','hearing','taste'])
+    def __init__(self,critter):
+        self.critter = critter
+        self.tick = None
+        self.done = set()
+        for organ in Senses.collections:
+            setattr(self,organ,SenseSet())
+    def refill(self):
+        self.tick = self.critter.world.clock
+        self.done.clear()
+        self.critter.world.senses_offered += 1
+        # Not left for later: by the time the brain asks, this tick's
+        #   metabolism has already come out of the critter's health
+        self['body']
+        return self
+    def pack(self):
+        # Everything, as plain tuples and names, for a brain in another process
+        loc = self['gps']
+        return {
+            'sight':   [tuple(s) for s in self['sight']],
+            'smell':   [(kind.__name__,strength,change) for kind,strength,change in self['smell']],
+            'hearing': [tuple(s) for s in self['hearing']],
+            'taste':   [kind.__name__ for kind in self['taste']],
+            'body':    tuple(self['body']),
+            'gps':     (loc.x,loc.y),
+            'compass': self['compass'],
+            }
+    def __getitem__(self,organ):
+        if organ not in self.done:
+            if organ not in Senses.organs: raise KeyError(organ)
+            counts = self.critter.world.senses_computed
+            counts[organ] = counts.get(organ,0) + 1
+            sense = getattr(self.critter,Senses.organs[organ])
+            if organ in Senses.collections:
+                found = getattr(self,organ)
+                found.clear()
+                sense(found)
+            else:
+                setattr(self,organ,sense())
+            self.done.add(organ)
+        return getattr(self,organ)
+    def __iter__(self):
+        return iter(Senses.organs)
+    def __len__(self):
+        return len(Senses.organs)
+
+def unpack_senses(packed):
+    # Senses.pack undone, as an ordinary dictionary of sets
+    return {
+        'sight':   SenseSet((Critter.Sight if len(s) == 5 else Critter.CrowdSight)(*s) for s in packed['sight']),
+        'smell':   SenseSet(Critter.Smell(globals()[kind],strength,change) for kind,strength,change in packed['smell']),
+        'hearing': SenseSet(Critter.Sound(*s) for s in packed['hearing']),
+        'taste':   SenseSet(globals()[kind] for kind in packed['taste']),
+        'body':    Critter.State(*packed['body']),
+        'gps':     Point(*packed['gps']),
+        'compass': packed['compass'],
+        }
+
+def stand_in(kind,x,y,color):
+    # Something of the right type, in the right place, for a brain in another
+    #   process to be told it bumped into
+    obj = globals()[kind].__new__(globals()[kind])
+    obj.location = Point(x,y)
+    obj.color = color
+    return obj
+
 class Critter(PhysicalObject):
     def __init__(self,world,brain_class,name):
         PhysicalObject.__init__(self,world,None)
         if isinstance(name,int):
             name = brain_class.owner + brain_class.code + str(name)
         self.name  = name
+        self.rng   = world.streams.brain(name)
         self.heading = Heading(uniform(0.0,2*math.pi))
         profile = [uniform(0.5,0.8) for i in range(0,10)]
         self.shape   = [1.0,0.8]+profile+list(reversed(profile))+[0.8]
         self.mass = 25
         self.color = {"fill":random_color(), "smooth":1, "stipple":'gray50'}
+        self.brain_class = brain_class
         self.brain = brain_class()
         self.last_spoke = -10
+        self.sense_records = (Senses(self),Senses(self))
         self.sense_data = None
+        self.decisions = 0
+        self.brain_wall = 0.0
+        self.brain_cpu = 0.0
+        self.spent_at = None
+        self.spent = 0.0
+        self.decided_at = None
+        self.decided = None
+        self.ready_at = None
+        self.last_seen = {}
+        self.last_smelled = {}
         self.whats_under = set()
         self.age = 0
         self.hardness = 0.5
@@ -247,18 +494,30 @@ class Critter(PhysicalObject):
     acceleration_cost = 40
     def on_tick(self):
         if self.dead: return
-        if not self.undead(): self.age += 1
-        for x in list(self.whats_under):
-            if x.radius() <= 0 or self.distance_to(x) > self.radius() + x.radius():
-                self.whats_under.remove(x)
+        self.get_ready()
         self.sense_data = self.senses()
         self.mass -= self.metabolic_cost + self.movement_cost*self.heading.rho*self.heading.rho
         if self.mass <= 0:
-            self.die(sound="..nnn...nnn..nnn...",volume=6)
+            self.starve()
         else:
             self.act(self.brain_on_tick() or "Pass")
             self.location.translate(self.heading.x,self.heading.y)
             self.location = self.world.wrap(self.location)
+    def get_ready(self):
+        # The start of a critter's turn, before it senses anything; brains
+        #   that decide ahead of everyone's turns have it done early, so they
+        #   see the same age and taste as the rest
+        if self.ready_at == self.world.clock: return
+        self.ready_at = self.world.clock
+        if not self.undead(): self.age += 1
+        self.check_whats_under()
+    def check_whats_under(self):
+        for x in list(self.whats_under):
+            r = x.geometry().radius()
+            if r <= 0 or self.distance_to(x) > self.radius() + r:
+                self.whats_under.remove(x)
+    def starve(self):
+        self.die(sound="..nnn...nnn..nnn...",volume=6)
     def on_damage(self,amount):
         if amount > 0.1:
             self.say("Ooof!")
@@ -300,44 +559,57 @@ class Critter(PhysicalObject):
         if self.dead: return
         if self.secreting and randrange(0,2) == 0:
             Secretion(self.world,self.location)
-        sharpest_turn = 0.5
         if not cmd is None:
-            word = cmd.split()
-            if word[0] == "Stop":
-                self.heading = self.heading.normalized*(1/10000)
-            elif word[0] == "Go":
-                self.heading = self.heading.normalized
-            elif word[0] == "Turn":
-                self.heading = Heading(self.heading.phi+sorted([-sharpest_turn,float(word[1]),sharpest_turn])[1],rho=self.heading.rho)
-            elif word[0] == "Accelerate":
-                initial_speed = self.heading.rho
-                self.heading *= float(word[1])
-                if self.heading.rho > self.max_speed:
-                    self.heading *= self.max_speed/self.heading.rho
-                #if self.heading.rho != initial_speed:
-                #    print("%s lost %5.3f accelerating %5.3f -> %5.3f" %
-                #        (self.name,self.acceleration_cost*(self.heading.rho-initial_speed)**2,initial_speed,self.heading.rho))
-                self.mass -= self.acceleration_cost*(self.heading.rho-initial_speed)**2
-            elif word[0] == "Attack":
-                pass
-            elif word[0] == "Eat":
-                for f in self.whats_under:
-                    if isinstance(f,Food) and f.value > 0:
-                        self.say("Yum")
-                        f.value -= 0.1
-                        self.mass += 0.1
-                        break
-            elif word[0] == "Pass":
-                pass
-            elif word[0] == "Secrete":
-                if word[1] == "Nothing" or word[1] == "0":
-                    self.secreting = None
-                else:
-                    self.secreting = int(word[1])
-            elif word[0] == "Say":
-                self.say(cmd[4:])
-            else:
+            verb,arg = parse_command(cmd) if isinstance(cmd,str) else (cmd[0],cmd[1] if len(cmd) > 1 else None)
+            action = Critter.commands.get(verb)
+            if action is None:
                 print("Unknown command: {}".format(cmd))
+            else:
+                action(self,arg)
+    sharpest_turn = 0.5
+    def do_stop(self,arg):
+        self.heading = self.heading.normalized*(1/10000)
+    def do_go(self,arg):
+        self.asleep = False
+        self.heading = self.heading.normalized
+    def do_turn(self,amount):
+        sharpest_turn = self.sharpest_turn
+        self.heading = Heading(self.heading.phi+sorted([-sharpest_turn,float(amount),sharpest_turn])[1],rho=self.heading.rho)
+    def do_accelerate(self,ratio):
+        self.asleep = False
+        initial_speed = self.heading.rho
+        self.heading *= float(ratio)
+        if self.heading.rho > self.max_speed:
+            self.heading *= self.max_speed/self.heading.rho
+        #if self.heading.rho != initial_speed:
+        #    print("%s lost %5.3f accelerating %5.3f -> %5.3f" %
+        #        (self.name,self.acceleration_cost*(self.heading.rho-initial_speed)**2,initial_speed,self.heading.rho))
+        self.mass -= self.acceleration_cost*(self.heading.rho-initial_speed)**2
+    def do_nothing(self,arg):
+        pass
+    def do_eat(self,arg):
+        for f in sorted(self.whats_under,key=lambda x: x.serial):
+            if isinstance(f,Food) and f.value > 0:
+                self.say("Yum")
+                f.value -= 0.1
+                f.geometry_changed()
+                self.mass += 0.1
+                break
+    def do_secrete(self,what):
+        self.secreting = None if what in (None,0,"Nothing","0") else int(what)
+    def do_say(self,text):
+        self.say(text)
+    commands = {
+        STOP:       do_stop,
+        GO:         do_go,
+        TURN:       do_turn,
+        ACCELERATE: do_accelerate,
+        ATTACK:     do_nothing,
+        EAT:        do_eat,
+        PASS:       do_nothing,
+        SECRETE:    do_secrete,
+        SAY:        do_say,
+        }
     def radius(self):
         return math.sqrt(self.mass) if self.mass > 0 else 0
     def core_radius(self):
@@ -347,49 +619,160 @@ class Critter(PhysicalObject):
     def relative_heading_to(self,x):
         return self.relative_heading(self.displacement_to(x).phi)
     Sight = namedtuple("Sight", "color distance direction width change")
+    CrowdSight = namedtuple("CrowdSight", "color distance direction width change count")
     Sound = namedtuple("Sound", "text direction volume age")
     Smell = namedtuple("Smell", "smell strength change")
     State = namedtuple("State", "moving speed health age")
     def senses(self):
-        return {
-            'sight':   self.sight(), # set of tuples: (color,distance,direction,width,change)
-            'smell':   set(), # set of tuples: (smell,strength,change)
-            'hearing': set([Critter.Sound(s.text,self.relative_heading_to(s),s.volume/(1+self.distance_to(s)),s.age) for s in self.world.sounds]),
-            'taste':   set([type(x) for x in self.whats_under]),
-            'body':    Critter.State(self.heading.rho>0.1,self.heading.rho,self.mass,self.age),
-            'gps':     self.location,
-            'compass': self.heading.phi,
-          }
-    def sight(self):
-        objects = [((self.world.width+self.world.height)/8,0,AngularIntervalSet(-1.0,1.0),self.world)]
+        # Only one per tick, however many times we're asked; this tick's is
+        #   whichever record didn't hold last tick's
+        sd = self.sense_data
+        if sd is None or sd.tick != self.world.clock:
+            first,second = self.sense_records
+            sd = self.sense_data = (second if sd is first else first).refill()
+        return sd
+    def sense_smell(self,result=None):
+        result = SenseSet() if result is None else result
+        smells = self.world.smells
+        if smells is None: return result
+        now = self.world.clock
+        smelled = {}
+        for kind,strength in smells.at(self.location):
+            previous = self.last_smelled.get(kind)
+            if previous is None or previous[1] == now:
+                change = 0 if previous is None else previous[2]
+            else:
+                change = (strength-previous[0])/(now-previous[1])
+            smelled[kind] = (strength,now,change)
+            result.add(Critter.Smell(kind,strength,change))
+        self.last_smelled = smelled
+        return result
+    max_sounds = None
+    def sense_hearing(self,result=None):
+        result = SenseSet() if result is None else result
+        heard = [(s.volume/(1+d.rho),s.serial,s,d) for s,d in self.world.sounds_near(self.location)]
+        if self.max_sounds is not None and len(heard) > self.max_sounds:
+            # Only the loudest ones get through
+            heard = heapq.nlargest(self.max_sounds,heard,key=lambda h: h[:2])
+        result.update(Critter.Sound(s.text,self.relative_heading(d.phi),volume,s.age) for volume,serial,s,d in heard)
+        return result
+    def sense_taste(self,result=None):
+        result = SenseSet() if result is None else result
+        result.update(type(x) for x in self.whats_under)
+        return result
+    def sense_body(self):
+        return Critter.State(self.heading.rho>0.1,self.heading.rho,self.mass,self.age)
+    def sense_gps(self):
+        return self.location
+    def sense_compass(self):
+        return self.heading.phi
+    # How finely sight divides up the field of view; 0 means work it out
+    #   exactly with AngularIntervalSets (slower, especially in crowds).
+    sight_bins = 120
+    def sight_horizon(self):
+        return self.world.sight_horizon()
+    def sight_candidates(self):
+        # (distance,left,right,object) for everything we might be able to see,
+        #   with angles relative to the way we're facing
+        batch = self.world.sight_batch
+        if batch is not None and self in batch:
+            return batch[self]
+        spans = []
         forward = self.heading.phi
-        for o in self.world.neighbors_of(self):
-            if o != self:
-               d = self.displacement_to(o)-self.eye_offset()
-               d -= d*(o.radius()/d.rho)
+        eye = self.eye_offset()
+        loc = self.location
+        walls,visible = self.world.visible_walls(loc.x+eye.x,loc.y+eye.y)
+        for o in sorted(self.world.neighbors_of(self),key=by_serial):
+            if o != self and (o in visible or not o in walls):
+               r = o.geometry().radius()
+               d = self.displacement_to(o)-eye
+               d -= d*(r/d.rho)
                # We can only see things above our horizon, which we aproximate be saying they have
                #     to be within a quarter of the way around in either direction.
                if (d.x/self.world.width)**2 + (d.y/self.world.height)**2 < (1/4)**2:
                    # We can only see things in front of us
                    a = (d.phi-forward+math.pi) % (2*math.pi) - math.pi
-                   delta_a = math.atan2(o.radius(),d.rho)
+                   delta_a = math.atan2(r,d.rho)
                    if abs(a)-abs(delta_a) < 1:
-                       objects.append((d.rho,uniform(0.0,1.0),AngularIntervalSet(a-delta_a,a+delta_a),o))
+                       spans.append((d.rho,a-delta_a,a+delta_a,o))
+        return spans
+    # Level of detail: (distance,bins) pairs; past each distance, things
+    #   narrower than one of that many bins across the field of view are
+    #   lumped together per bin and seen as a single Crowd.
+    lod_bands = ()
+    def merge_distant(self,spans):
+        bands = sorted(self.lod_bands)
+        detailed = []
+        crowds = {}
+        for span in spans:
+            dist,left,right,obj = span
+            band = None
+            for i,(start,bins) in enumerate(bands):
+                if dist < start: break
+                band = i
+            if band is None or right-left >= 2/bands[band][1]:
+                detailed.append(span)
+                continue
+            bins = bands[band][1]
+            middle = min(max((left+right)/2,-1.0),1.0)
+            key = (band,min(bins-1,int((middle+1)*bins/2)))
+            if key in crowds:
+                crowds[key].add(obj,dist)
+            else:
+                crowds[key] = Crowd(key,obj,dist)
+        for (band,b),crowd in crowds.items():
+            width = 2/bands[band][1]
+            detailed.append((crowd.distance,-1+b*width,-1+(b+1)*width,crowd))
+        return detailed
+    def sight(self,sights=None):
+        spans = self.sight_candidates()
+        if self.lod_bands:
+            spans = self.merge_distant(spans)
+        if self.sight_bins:
+            return self.binned_sight(spans,self.sight_bins,sights)
+        else:
+            return self.exact_sight(spans,sights)
+    def exact_sight(self,spans,sights=None):
+        objects = [(self.sight_horizon(),0,AngularIntervalSet(-1.0,1.0),self.world)]
+        for dist,left,right,o in spans:
+            objects.append((dist,o.serial,AngularIntervalSet(left,right),o))
         # We can only see things within a two radian field of view
         view_mask = AngularIntervalSet(-1,+1)
-        sights = set()
-        for dist,rand,image,obj in sorted(objects):
+        sights = SenseSet() if sights is None else sights
+        seen = {}
+        for dist,serial,image,obj in sorted(objects):
              # we see all of the object not blocked by something closer
              visable_part = view_mask.intersection(image)
              # the object blocks things that are further
              view_mask    = view_mask.intersection(image.inverse())
              for segment in visable_part.ranges():
-                 color = obj.color['outline'] if 'outline' in obj.color else obj.color['fill']
-                 sights.add(Critter.Sight(color,dist,(segment[0]+segment[1])/2,segment[1]-segment[0],0))
+                 change = self.sight_change(obj,dist,seen)
+                 sights.add(seen_as(obj,sight_color(obj),dist,(segment[0]+segment[1])/2,segment[1]-segment[0],change))
              # stop when our field of view is full
              if view_mask.trivial(): break
-        # TODO: figure out how to calculate change
+        self.last_seen = seen
         return sights
+    def binned_sight(self,spans,bins,sights=None):
+        sights = SenseSet() if sights is None else sights
+        seen = {}
+        for obj,dist,left,right in depth_buffer(spans,bins,-1.0,+1.0,self.world,self.sight_horizon()):
+            sights.add(seen_as(obj,sight_color(obj),dist,(left+right)/2,right-left,self.sight_change(obj,dist,seen)))
+        self.last_seen = seen
+        return sights
+    def sight_change(self,obj,dist,seen):
+        # How fast obj's distance is changing (per tick), going by where it
+        #   was the last time we looked; seen collects this look's answers.
+        if obj in seen: return seen[obj][2]
+        now = self.world.clock
+        previous = self.last_seen.get(obj)
+        if previous is None:
+            change = 0
+        elif previous[1] == now:
+            change = previous[2]
+        else:
+            change = (dist-previous[0])/(now-previous[1])
+        seen[obj] = (dist,now,change)
+        return change
     def outline(self):
         r    = self.radius()
         loc  = self.location
@@ -422,37 +805,187 @@ class Critter(PhysicalObject):
     def draw(self, canvas,s):
         if self.dead:
             self.remove_image(canvas)
+            self.erase_senses(canvas)
         else:
             if not self.tk_ids: self.create_image(canvas)
             self.place_image(canvas,s)
             self.draw_senses(canvas,s)
-    def draw_senses(self,canvas,s):
+    def current_senses(self):
+        # This tick's senses, or None if we haven't sensed anything this tick
+        sd = self.sense_data
+        return sd if sd is not None and sd.tick == self.world.clock else None
+    def erase_senses(self,canvas):
         for part in self.sense_depiction_ids: canvas.delete(part)
+        self.sense_depiction_ids = []
+    def draw_senses(self,canvas,s):
+        self.erase_senses(canvas)
+        sd = self.current_senses()
+        # Only what the brain actually looked at; working sight out just to
+        #   draw it would change the critter's next Sight.change
+        if sd is None or not self.world.show_senses or not 'sight' in sd.done: return
         outline = self.outline()
         x,y = outline[0]
-        sd = self.sight()
-        for sight in sd: #self.sense_data['sight']:
+        for sight in sd['sight']:
             d = sight.distance
             h = sight.direction + self.heading.phi
             self.sense_depiction_ids.append(
                 canvas.create_line(x*s,y*s, s*(x+d*math.cos(h)),s*(y+d*math.sin(h)), fill=sight.color,stipple=stipple(200/(d+1)))
                 )
     def brain_on_tick(self):
-        try:
-            return self.brain.on_tick(self.sense_data)
-        except Exception as e:
-            traceback.print_tb(sys.exc_info()[-1], limit=3)
-            self.die()
+        if self.decided_at == self.world.clock:
+            # Already decided, along with the rest of its brain class
+            return self.decided
+        return self.consult(self.brain.on_tick,self.sense_data)
     def brain_on_collision(self,dir,other):
+        return self.consult(self.brain.on_collision,dir,other,self.sense_data)
+    def consult(self,callback,*args):
+        # Ask the brain, with its own random stream, and charge it for the
+        #   time taken (including any senses it looks at for the first time).
+        world = self.world
+        if self.spent_at != world.clock:
+            self.spent_at,self.spent = world.clock,0.0
+        elif world.brain_budget is not None and self.spent > world.brain_budget and world.budget_policy == 'skip':
+            return None
+        command = None
+        previous = Streams.use(self.rng)
+        wall,cpu = time.perf_counter(),time.process_time()
         try:
-            return self.brain.on_collision(dir,other,self.sense_data)
+            command = callback(*args)
         except Exception as e:
             traceback.print_tb(sys.exc_info()[-1], limit=3)
             self.die()
+        finally:
+            wall,cpu = time.perf_counter()-wall,time.process_time()-cpu
+            Streams.use(previous)
+        if isinstance(self.brain,RemoteBrain):
+            # What it took over there, not how long it took to hand it over
+            wall,cpu = self.brain.cost
+        return self.settle(command,wall,cpu)
+    def settle(self,command,wall,cpu):
+        # Charge the brain for a decision, and hold it to its budget
+        world = self.world
+        if self.spent_at != world.clock:
+            self.spent_at,self.spent = world.clock,0.0
+        self.spent += wall
+        world.charge(self,wall,cpu)
+        if world.brain_budget is not None and self.spent > world.brain_budget:
+            return world.overspent(self,command)
+        return command
+
+class Bodies:
+    # Struct-of-arrays store for critter physics (position, heading, mass and
+    #   age), so that metabolism, movement, wrapping and starvation can each be
+    #   done for every critter at once.  Slots are never reused; dead critters
+    #   just stop being updated.
+    ALIVE,DEAD,UNDEAD = 0,1,2
+    fields = ['x','y','hx','hy','mass','age','metabolic_cost','movement_cost']
+    def __init__(self,world,capacity=64):
+        if numpy is None:
+            raise RuntimeError("Array physics needs numpy")
+        self.world = world
+        self.count = 0
+        self.members = []
+        self.generation = 0
+        for f in self.fields:
+            setattr(self,f,numpy.zeros(capacity))
+        self.status = numpy.zeros(capacity,dtype=numpy.int8)
+    def add(self,critter):
+        if self.count == len(self.status):
+            for f in self.fields+['status']:
+                old = getattr(self,f)
+                setattr(self,f,numpy.concatenate([old,numpy.zeros_like(old)]))
+        i = self.count
+        self.count += 1
+        self.members.append(critter)
+        self.metabolic_cost[i] = Critter.metabolic_cost
+        self.movement_cost[i]  = Critter.movement_cost
+        return i
+    def before_tick(self):
+        n = self.count
+        status = self.status[:n]
+        active = status != Bodies.DEAD
+        self.age[:n] += status == Bodies.ALIVE
+        hx,hy = self.hx[:n],self.hy[:n]
+        mass = self.mass[:n]
+        mass -= numpy.where(active,self.metabolic_cost[:n] + self.movement_cost[:n]*(hx*hx+hy*hy),0.0)
+        for i in numpy.nonzero(active & (mass <= 0))[0]:
+            self.members[i].starve()
+    def after_tick(self):
+        n = self.count
+        active = self.status[:n] != Bodies.DEAD
+        x,y = self.x[:n],self.y[:n]
+        x += numpy.where(active,self.hx[:n],0.0)
+        y += numpy.where(active,self.hy[:n],0.0)
+        numpy.mod(x,self.world.width,out=x)
+        numpy.mod(y,self.world.height,out=y)
+        self.generation += 1
+
+def body_field(name,kind=float):
+    def get(self):
+        return kind(getattr(self.bodies,name)[self.slot])
+    def set(self,value):
+        getattr(self.bodies,name)[self.slot] = value
+    return property(get,set)
+
+class BodyCritter(Critter):
+    # A critter whose physical state lives in the world's Bodies arrays;
+    #   World.tick has the arrays do the metabolism and moving for it.
+    def __init__(self,world,brain_class,name):
+        self.bodies = world.bodies
+        self.slot = world.bodies.add(self)
+        self.location_cache = (None,None)
+        self.heading_cache = None
+        Critter.__init__(self,world,brain_class,name)
+    mass           = body_field('mass')
+    age            = body_field('age',int)
+    metabolic_cost = body_field('metabolic_cost')
+    movement_cost  = body_field('movement_cost')
+    @property
+    def location(self):
+        generation,loc = self.location_cache
+        if generation != self.bodies.generation or loc is None:
+            i = self.slot
+            loc = Point(self.bodies.x[i],self.bodies.y[i])
+            self.location_cache = (self.bodies.generation,loc)
+        return loc
+    @location.setter
+    def location(self,loc):
+        if loc is not None:
+            self.bodies.x[self.slot] = loc.x
+            self.bodies.y[self.slot] = loc.y
+        self.location_cache = (None,None)
+    @property
+    def heading(self):
+        if self.heading_cache is None:
+            self.heading_cache = Vector(self.bodies.hx[self.slot],self.bodies.hy[self.slot])
+        return self.heading_cache
+    @heading.setter
+    def heading(self,h):
+        self.bodies.hx[self.slot] = h.x
+        self.bodies.hy[self.slot] = h.y
+        self.heading_cache = h
+    @property
+    def dead(self):
+        return {Bodies.ALIVE:False,Bodies.DEAD:True,Bodies.UNDEAD:None}[self.bodies.status[self.slot]]
+    @dead.setter
+    def dead(self,value):
+        self.bodies.status[self.slot] = {False:Bodies.ALIVE,True:Bodies.DEAD,None:Bodies.UNDEAD}[value]
+    def get_ready(self):
+        # Bodies has done the aging already
+        if self.ready_at == self.world.clock: return
+        self.ready_at = self.world.clock
+        self.check_whats_under()
+    def on_tick(self):
+        # Aging, metabolism and movement are done by Bodies
+        if self.dead: return
+        self.get_ready()
+        self.sense_data = self.senses()
+        self.act(self.brain_on_tick() or "Pass")
 
 class CritterBrain:
     code  = ''
     owner = None
+    source = None
     def dump_status(self):
         pass
     def on_collision(self,dir,other,senses):
@@ -461,6 +994,53 @@ class CritterBrain:
         pass
     def on_tick(self,senses):
         pass
+    # A brain class can instead define
+    #
+    #     @classmethod
+    #     def on_tick_batch(cls,senses):
+    #
+    #   to decide for all its critters at once; senses is a SenseColumns and
+    #   it should return a list of commands in the same order.
+    on_tick_batch = None
+
+class SenseColumns(Mapping):
+    # The senses of a whole brain class's critters, a column at a time:
+    #   'brains' (the brain instances), a list of sets for each of 'sight',
+    #   'smell', 'hearing' and 'taste', and arrays (numpy ones if it's
+    #   around) for 'moving', 'speed', 'health', 'age', 'x', 'y' and
+    #   'compass'.  Like Senses, columns are only made when asked for.
+    numeric = {
+        'moving':  ('body','moving'),
+        'speed':   ('body','speed'),
+        'health':  ('body','health'),
+        'age':     ('body','age'),
+        'x':       ('gps','x'),
+        'y':       ('gps','y'),
+        'compass': ('compass',None),
+        }
+    names = ['brains','sight','smell','hearing','taste'] + list(numeric)
+    def __init__(self,brains,senses):
+        # senses has each critter's Senses (or, in a BrainHost worker, its
+        #   unpacked senses), in the same order as brains
+        self.senses = senses
+        self.columns = {'brains':list(brains)}
+    def __getitem__(self,name):
+        columns = self.columns
+        if name not in columns:
+            if name in Senses.collections:
+                columns[name] = [s[name] for s in self.senses]
+            elif name in SenseColumns.numeric:
+                organ,field = SenseColumns.numeric[name]
+                values = [s[organ] for s in self.senses]
+                if field: values = [getattr(v,field) for v in values]
+                columns[name] = values if numpy is None else numpy.array(values)
+            else:
+                raise KeyError(name)
+        return columns[name]
+    def __iter__(self):
+        return iter(SenseColumns.names)
+    def __len__(self):
+        return len(SenseColumns.names)
 
 class ZombieBrain(CritterBrain):
     def on_tick(self,senses):
@@ -476,6 +1056,37 @@ class ZombieBrain(CritterBrain):
         else:
             return "Turn {}".format(target)
 
+class RemoteBrain(CritterBrain):
+    # Stands in for a critter's brain while the real one runs in a BrainHost
+    #   worker.  The world gets this tick's command for it (along with
+    #   everyone else on its team) before the critters move; collisions
+    #   can't wait, so they're asked about one at a time.
+    def __init__(self,host,critter):
+        self.host = host
+        self.critter = critter
+        self.file = critter.brain_class.source
+        self.reply = None
+        self.cost = (0.0,0.0)
+    def answer(self,reply):
+        # reply is (ok,command,wall,cpu), or None if the worker is gone
+        ok,command,wall,cpu = reply or (False,None,0.0,0.0)
+        self.cost = (wall,cpu)
+        if not ok:
+            self.critter.die()
+        return command
+    def on_tick(self,senses):
+        reply,self.reply = self.reply,None
+        return self.answer(reply)
+    def on_collision(self,dir,other,senses):
+        kind = 'Critter' if isinstance(other,Critter) else type(other).__name__
+        loc = other.location
+        c = self.critter
+        return self.answer(self.host.collide(self.file,(c.name,c.brain_class.__name__,(dir.x,dir.y),(kind,loc.x,loc.y,other.color),senses.pack())))
+
+def brain_kind(critter):
+    # What to charge the critter's thinking to
+    return critter.brain_class if isinstance(critter.brain,RemoteBrain) else type(critter.brain)
+
 class Food(PhysicalObject):
     def __init__(self,world,loc,value):
         PhysicalObject.__init__(self,world,loc)
@@ -517,6 +1128,9 @@ class GoldStar(Block):
     def on_collision(self,dir,other):
         other.finished -= 50
         self.location = self.world.random_location()
+        self.geometry_changed()
+        self.world.grid.move(self,self.location.x,self.location.y)
+        self.world.relocated.append(self)
     def radius(self):
         return self.r
     def core_radius(self):
@@ -528,32 +1142,118 @@ class GoldStar(Block):
         q    = 2*math.pi/sides
         return [(loc.x+r[a%2]*math.cos(a*q),loc.y+r[a%2]*math.sin(a*q)) for a in range(0,sides)]
 
+class SmellField:
+    # Scent as a grid of concentrations over the torus, one layer per kind of
+    #   smell.  Things deposit into the cell they're in, and each tick every
+    #   layer diffuses (to the four neighboring cells) and decays in one
+    #   array operation, so smelling is a single lookup no matter how many
+    #   sources there are.
+    kinds = [Food,Secretion]
+    cell_size = 2.0
+    diffusion = 0.2     # must stay under 0.25 or it oscillates
+    decay     = 0.02
+    food_rate = 0.01    # per unit of food value per tick
+    secretion_strength = 1.0
+    faintest  = 0.001
+    def __init__(self,width,height):
+        if numpy is None:
+            raise RuntimeError("The smell field needs numpy")
+        self.cols = max(1,int(width//self.cell_size))
+        self.rows = max(1,int(height//self.cell_size))
+        self.cell_width  = width/self.cols
+        self.cell_height = height/self.rows
+        self.layer = {kind:i for i,kind in enumerate(self.kinds)}
+        self.field = numpy.zeros((len(self.kinds),self.cols,self.rows))
+    def cell_at(self,x,y):
+        return (int(x//self.cell_width) % self.cols,int(y//self.cell_height) % self.rows)
+    def deposit(self,kind,loc,amount):
+        i,j = self.cell_at(loc.x,loc.y)
+        self.field[self.layer[kind],i,j] += amount
+    def deposit_food(self,food):
+        if not food: return
+        cells = numpy.array([self.cell_at(f.location.x,f.location.y) for f in food])
+        amounts = numpy.array([f.value for f in food],dtype=float)*self.food_rate
+        numpy.add.at(self.field[self.layer[Food]],(cells[:,0],cells[:,1]),amounts)
+    def on_tick(self,food):
+        self.deposit_food(food)
+        f = self.field
+        spread = numpy.roll(f,1,axis=1)+numpy.roll(f,-1,axis=1)+numpy.roll(f,1,axis=2)+numpy.roll(f,-1,axis=2)
+        f += self.diffusion*(spread-4*f)
+        f *= 1-self.decay
+    def at(self,loc):
+        # (kind,strength) for every smell noticeable at loc
+        i,j = self.cell_at(loc.x,loc.y)
+        return [(kind,s) for kind,s in zip(self.kinds,self.field[:,i,j].tolist()) if s >= self.faintest]
+
 class World:
     height = 100
     width  = 200
     neighborhood_refresh = 4
     neighborhood_radius_x = width/6 +Critter.max_speed*neighborhood_refresh
     neighborhood_radius_y = height/6+Critter.max_speed*neighborhood_refresh
+    # How far something can wander from where its neighbors were last found
+    #   before we look again; a pair can drift three times this far apart
+    #   (or together) between updates, which the padding above covers.
+    neighborhood_slack = Critter.max_speed*neighborhood_refresh/3
+    sleep_speed = 0.01
+    budget_policies = ('warn','skip','kill')
+    visibility_cell = 1.0
+    # Sounds heard more faintly than this (volume/(1+distance)) aren't heard at all
+    faintest_sound = 0.25
+    sound_cell = 10.0
     color = {"fill":"#000"}
-    def __init__(self,tick_time=0.1,tick_limit=-1,food=50,pits=0,stars=0,warn=False,blocks=0,zombies=False,stop_count=None):
+    def __init__(self,tick_time=0.1,tick_limit=-1,food=50,pits=0,stars=0,warn=False,blocks=0,zombies=False,stop_count=None,headless=False,free_run=False,array_physics=False,seed=None,show_senses=True,smell=False,batched_sight=False,brain_budget=None,budget_policy='warn',brain_host=False,brain_timeout=1.0,sleep=False):
+        self.serials = itertools.count()
+        self.streams = Streams(seed)
+        Streams.use(self.streams.world)
         self.critters = []
         self.starting_critters = []
-        self.world_view = WorldView(self,5)
+        Secretion.reset()
+        self.world_view = NullView(self) if headless else WorldView(self,5)
+        self.bodies = Bodies(self) if array_physics else None
+        self.smells = SmellField(self.width,self.height) if smell else None
+        self.sleep = sleep
+        self.grid = SpatialGrid(self.width,self.height,self.neighborhood_radius_x,self.neighborhood_radius_y)
         self.food   = [Food(self,self.random_location(),randrange(2,16)) for i in range(0,food)]
         self.pits   = [Pit(self,self.random_location()) for i in range(0,pits)]
         self.stars  = [GoldStar(self,self.random_location()) for i in range(0,stars)]
         self.blocks = [Block(self,self.random_location(),randrange(1,10),randrange(1,10))  for i in range(0,blocks)]
         #self.finish_line()
         self.maze(6,12)
+        for o in self.physical_objects():
+            self.grid.insert(o,o.location.x,o.location.y)
         self.sounds = []
+        self.sound_grid = SpatialGrid(self.width,self.height,self.sound_cell,self.sound_cell)
+        self.sound_reach = 0
         self.clock = 0
+        self.visibility = None
+        if batched_sight and numpy is None:
+            raise RuntimeError("Batched sight needs numpy")
+        self.batched_sight = batched_sight
+        self.sight_batch = None
         self.neighbors = {}
+        self.neighbor_anchors = {}
+        self.watchers = {}
+        self.relocated = []
+        self.senses_offered = 0
+        self.senses_computed = {}
+        self.broad_phase_stats = {'ticks':0,'objects':0,'possible':0,'candidates':0,'slept':0}
         self.tick_time = tick_time
         self.tick_limit = tick_limit
         self.warn = warn
+        if not budget_policy in World.budget_policies:
+            raise ValueError("Unknown budget policy: {}".format(budget_policy))
+        self.brain_budget = brain_budget
+        self.budget_policy = budget_policy
+        self.brain_costs = {}
+        self.batch_streams = {}
+        self.brain_host = BrainHost(seed,brain_timeout) if brain_host else None
         self.zombies_allowed = zombies
         self.zombies = []
         self.stop_count = stop_count
+        self.free_run = free_run
+        self.show_senses = show_senses
+        self.run_time = 0.0
     def finish_line(self):
         fl_segments = 10
         fl_height = self.height / fl_segments
@@ -600,74 +1300,278 @@ class World:
     def display_objects(self):
         return self.physical_objects() + self.sounds
     def sound(self,loc,volume,text):
-        self.sounds.append(Sound(self,loc,volume,text))
+        s = Sound(self,loc,volume,text)
+        s.reach = max(0,volume/self.faintest_sound-1)
+        self.sounds.append(s)
+        self.sound_grid.insert(s,loc.x,loc.y)
+        self.sound_reach = max(self.sound_reach,s.reach)
+    def forget_faded_sounds(self):
+        for s in self.sounds:
+            if s.faded: self.sound_grid.remove(s)
+        self.sounds = [s for s in self.sounds if not s.faded]
+        self.sound_reach = max([s.reach for s in self.sounds] or [0])
+    def sounds_near(self,loc):
+        # (sound,displacement) for each sound loud enough to be heard at loc
+        reach = self.sound_reach
+        for s in self.sound_grid.near(loc.x,loc.y,reach,reach):
+            d = self.wrap(Vector(loc,s.location))
+            if d.rho <= s.reach:
+                yield s,d
+    def update_grid(self):
+        # Done between ticks, since evicting things from neighbor sets while
+        #   someone is looping over them would go badly.
+        for f in self.food:
+            if f.value <= 0:
+                self.grid.remove(f)
+                self.evict(f)
+        for o in self.relocated:
+            self.evict(o)
+            self.introduce(o)
+            # Whatever it landed on should notice
+            for c in self.critters: c.asleep = False
+        self.relocated = []
+        for c in self.critters:
+            if c.dead:
+                self.grid.remove(c)
+                self.evict(c)
+            else:
+                loc = c.location
+                crossed = self.grid.move(c,loc.x,loc.y)
+                anchor = self.neighbor_anchors.get(c)
+                if crossed or not anchor or self.wrap(Vector(loc.x-anchor[0],loc.y-anchor[1])).rho > self.neighborhood_slack:
+                    self.find_neighbors(c)
+    def sight_horizon(self):
+        return (self.width+self.height)/8
+    def visible_walls(self,x,y):
+        # (walls,visible): the static walls, and those of them an eye at
+        #   (x,y) might see past the others; the rest needn't be looked at
+        if self.visibility is None:
+            walls = [b for b in self.blocks if b.anchored]
+            self.visibility = VisibilityIndex(walls,self.width,self.height,self.visibility_cell,self.sight_horizon())
+        return self.visibility.indexed,self.visibility.visible_from(x,y)
+    def batch_sight(self,viewers):
+        # sight_candidates for all the viewers at once, as things stand now:
+        #   the (viewer,object) pairs are gathered from the neighbor sets and
+        #   then the displacements, angles and angular widths for all of them
+        #   are worked out as arrays.  Only occlusion is left to each critter.
+        columns = {}
+        rows,cols = [],[]
+        vx,vy,ex,ey,forward = [],[],[],[],[]
+        for i,c in enumerate(viewers):
+            loc = c.location
+            eye = c.eye_offset()
+            vx.append(loc.x); vy.append(loc.y)
+            ex.append(eye.x); ey.append(eye.y)
+            forward.append(c.heading.phi)
+            walls,visible = self.visible_walls(loc.x+eye.x,loc.y+eye.y)
+            for o in sorted(self.neighbors_of(c),key=by_serial):
+                if o is not c and (o in visible or not o in walls):
+                    rows.append(i)
+                    cols.append(columns.setdefault(o,len(columns)))
+        batch = {c:[] for c in viewers}
+        if not rows: return batch
+        things = list(columns)
+        rows,cols = numpy.array(rows),numpy.array(cols)
+        ox = numpy.array([o.location.x for o in things])[cols]
+        oy = numpy.array([o.location.y for o in things])[cols]
+        r  = numpy.array([o.geometry().radius() for o in things])[cols]
+        w,h = self.width,self.height
+        dx = (ox-numpy.array(vx)[rows]+w/2) % w - w/2 - numpy.array(ex)[rows]
+        dy = (oy-numpy.array(vy)[rows]+h/2) % h - h/2 - numpy.array(ey)[rows]
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+            # Measure to the near side of the thing rather than its center
+            shrink = 1-r/numpy.hypot(dx,dy)
+            dx,dy = dx*shrink,dy*shrink
+            dist = numpy.hypot(dx,dy)
+            above_horizon = (dx/w)**2 + (dy/h)**2 < (1/4)**2
+            a = (numpy.arctan2(dy,dx)-numpy.array(forward)[rows]+math.pi) % (2*math.pi) - math.pi
+            delta_a = numpy.arctan2(r,dist)
+            keep = numpy.nonzero(above_horizon & (numpy.abs(a)-numpy.abs(delta_a) < 1))[0]
+        for i,col,d,left,right in zip(rows[keep].tolist(),cols[keep].tolist(),dist[keep].tolist(),(a-delta_a)[keep].tolist(),(a+delta_a)[keep].tolist()):
+            batch[viewers[i]].append((d,left,right,things[col]))
+        return batch
+    def in_neighborhood(self,c,o):
+        disp = c.displacement_to(o)
+        return (disp.x/self.neighborhood_radius_x)**2 + (disp.y/self.neighborhood_radius_y)**2 < 1
     def find_neighbors(self,c):
-        self.neighbors[c] = set([self.blocks[-1]])
-        others = set(self.physical_objects())
-        others.remove(c)
-        for o in others:
-            disp = c.displacement_to(o)
-            if (disp.x/self.neighborhood_radius_x)**2 + (disp.y/self.neighborhood_radius_y)**2 < 1:
-                self.neighbors[c].add(o)
+        self.forget_neighbors(c)
+        found = set([self.blocks[-1]])
+        loc = c.location
+        # Things can drift up to a tick's worth of movement between grid updates
+        slack = Critter.max_speed
+        for o in self.grid.near(loc.x,loc.y,self.neighborhood_radius_x+slack,self.neighborhood_radius_y+slack):
+            if o is not c and self.in_neighborhood(c,o):
+                found.add(o)
+        self.neighbors[c] = found
+        self.neighbor_anchors[c] = (loc.x,loc.y)
+        # Keep things symmetric, so others needn't notice that we came to
+        #   them or that we left; watchers[c] is everyone with c in their set
+        for o in list(self.watchers.get(c,())):
+            if not o in found:
+                self.neighbors[o].discard(c)
+                self.watchers[c].discard(o)
+        for o in found:
+            self.watch(c,o)
+            if o in self.neighbors: self.watch(o,c)
+    def watch(self,c,o):
+        self.neighbors[c].add(o)
+        if not o in self.watchers: self.watchers[o] = set()
+        self.watchers[o].add(c)
+    def forget_neighbors(self,c):
+        for o in self.neighbors.pop(c,()):
+            if o in self.watchers: self.watchers[o].discard(c)
+        self.neighbor_anchors.pop(c,None)
+    def evict(self,o):
+        self.forget_neighbors(o)
+        for c in self.watchers.pop(o,()):
+            self.neighbors[c].discard(o)
+    def introduce(self,o):
+        loc = o.location
+        for c in self.grid.near(loc.x,loc.y,self.neighborhood_radius_x,self.neighborhood_radius_y):
+            if c in self.neighbors and c is not o and self.in_neighborhood(c,o):
+                self.watch(c,o)
     def neighbors_of(self,c):
         if not c in self.neighbors: self.find_neighbors(c)
         return self.neighbors[c]
-    def run(self):
+    def finished(self):
         stop_count = self.stop_count or len(self.starting_critters) and math.log(math.e*len(self.starting_critters))
-        while self.world_view.window_open and self.clock != self.tick_limit and len([c for c in self.critters if c.dead == False]) >= stop_count:
-            loop_start = time.time()
-            self.clock += 1
-            self.lighting = sorted([0,2*math.cos(self.clock/1000),1])[1]
-            self.sounds   = [s for s in self.sounds if not s.faded]
-            self.food     = [f for f in self.food if f.value > 0]
-            if self.zombies_allowed:
-                self.zombies += [c for c in self.critters if c.dead]
-            self.critters = [c for c in self.critters if not c.dead]
-            if self.lighting == 0:
-                for c in self.zombies:
-                    c.arise()
-                    self.critters.append(c)
-                self.zombies = []
-            Secretion.on_tick()
-            shuffle(self.critters)
-            if self.clock % self.neighborhood_refresh == 0:
-                self.neighbors = {}
-            for c in self.display_objects():
-                c.on_tick()
-            changes = []
-            checked = {}
-            for c in self.critters+self.blocks:
-                if not c.anchored:
-                    checked[c] = True
-                    c_outline = c.outline()
-                    c_polygon = Polygon(c_outline)
-                    core_radius = c.core_radius()
-                    for o in self.neighbors_of(c):
-                        if not checked.get(o,False):
-                            d = c.distance_to(o)
-                            if d >= c.radius() + o.radius():
-                                pass # they missed
-                            elif d < core_radius + o.core_radius():
-                                # solid hit
-                                self.process_collision(c,o,changes)
-                            elif overlap(c_polygon,Polygon(o.outline()),c1=c.location,c2=o.location,r1=c.radius(),r2=o.radius()):
-                                # glancing blow
-                                self.process_collision(c,o,changes)
-            for o,d_phi,d_loc in changes:
-                o.heading = Heading(o.heading.phi+d_phi,rho=o.heading.rho/2)
-                o.location = self.wrap(Point(Vector(o.location)+d_loc))
-            self.world_view.on_tick()
-            excess_time = self.tick_time-(time.time()-loop_start)
-            if excess_time > 0:
-                time.sleep(excess_time)
-            elif self.warn:
-                print("Tick over time by ",-excess_time," seconds!")
+        return not (self.world_view.window_open and self.clock != self.tick_limit and len([c for c in self.critters if c.dead == False]) >= stop_count)
+    def run(self):
+        run_start = time.time()
+        try:
+            while not self.finished():
+                loop_start = time.time()
+                self.tick()
+                if self.free_run:
+                    continue
+                excess_time = self.tick_time-(time.time()-loop_start)
+                if excess_time > 0:
+                    time.sleep(excess_time)
+                elif self.warn:
+                    print("Tick over time by ",-excess_time," seconds!")
+        finally:
+            self.run_time += time.time()-run_start
+    def step(self,n=1):
+        run_start = time.time()
+        try:
+            for i in range(0,n):
+                if self.finished(): break
+                self.tick()
+        finally:
+            self.run_time += time.time()-run_start
+        return self.clock
+    def tick(self):
+        Streams.use(self.streams.physics)
+        self.clock += 1
+        self.lighting = sorted([0,2*math.cos(self.clock/1000),1])[1]
+        self.forget_faded_sounds()
+        self.update_grid()
+        self.food     = [f for f in self.food if f.value > 0]
+        if self.zombies_allowed:
+            self.zombies += [c for c in self.critters if c.dead]
+        self.critters = [c for c in self.critters if not c.dead]
+        if self.lighting == 0:
+            for c in self.zombies:
+                c.arise()
+                self.critters.append(c)
+            self.zombies = []
+        Secretion.on_tick()
+        shuffle(self.critters)
+        if self.bodies: self.bodies.before_tick()
+        if self.batched_sight:
+            self.sight_batch = self.batch_sight([c for c in self.critters if not c.dead])
+        if self.brain_host:
+            self.think_remotely()
+        self.think_in_batches()
+        for c in self.display_objects():
+            c.on_tick()
+        self.sight_batch = None
+        if self.bodies: self.bodies.after_tick()
+        if self.smells: self.smells.on_tick(self.food)
+        changes = []
+        checked = {}
+        shapes = {}
+        def shape_of(o):
+            if not o in shapes: shapes[o] = o.geometry()
+            return shapes[o]
+        candidates = self.collision_candidates(shape_of)
+        for c in self.critters+self.blocks:
+            if not c.anchored:
+                checked[c] = True
+                cg = shape_of(c)
+                for o in candidates.get(c,()):
+                    # A sleeper still lands on floor mats (it may want to eat)
+                    if c.asleep and o.anchored and not o.floor_mat:
+                        self.broad_phase_stats['slept'] += 1
+                    elif not checked.get(o,False):
+                        og = shape_of(o)
+                        d = c.distance_to(o)
+                        if d >= cg.radius() + og.radius():
+                            pass # they missed
+                        elif d < cg.core_radius() + og.core_radius():
+                            # solid hit
+                            self.process_collision(c,o,changes)
+                        elif narrowphase.overlap(cg.shape(),og.shape(),*self.seam_offset(c,o)):
+                            # glancing blow
+                            self.process_collision(c,o,changes)
+        for o,d_phi,d_loc in changes:
+            o.heading = Heading(o.heading.phi+d_phi,rho=o.heading.rho/2)
+            o.location = self.wrap(Point(Vector(o.location)+d_loc))
+        self.update_sleep()
+        Streams.use(self.streams.render)
+        self.world_view.on_tick()
+        Streams.use(self.streams.physics)
+    def update_sleep(self):
+        # Critters that have all but stopped and weren't hit this tick doze
+        #   off; they don't need checking against solid things that never
+        #   move until a collision or a "Go" / "Accelerate" wakes them.
+        #   Off unless asked for, since a sleeper can still creep, very
+        #   slowly, into a wall it then doesn't bump into.
+        if not self.sleep: return
+        for c in self.critters:
+            c.asleep = c.heading.rho < self.sleep_speed and c.last_hit != self.clock and not c.dead
+    def collision_candidates(self,shape_of):
+        # Broad phase: only things whose bounding boxes overlap can collide.
+        #   Anchored things use their (cached) outline's box, everything else
+        #   the box around its radius.
+        objects = self.physical_objects()
+        boxes = []
+        for o in objects:
+            if o.anchored:
+                boxes.append(shape_of(o).bounding_box())
+            else:
+                loc,r = o.location,shape_of(o).radius()
+                boxes.append((loc.x-r,loc.y-r,loc.x+r,loc.y+r))
+        movable = [not o.anchored for o in objects]
+        pairs = sweep_and_prune(boxes,self.width,self.height,movable)
+        candidates = {}
+        for i,j in pairs:
+            a,b = objects[i],objects[j]
+            candidates.setdefault(a,[]).append(b)
+            candidates.setdefault(b,[]).append(a)
+        m = sum(movable)
+        stats = self.broad_phase_stats
+        stats['ticks']      += 1
+        stats['objects']    += len(objects)
+        stats['possible']   += m*(m-1)//2 + m*(len(objects)-m)
+        stats['candidates'] += len(pairs)
+        return candidates
+    def seam_offset(self,a,b):
+        # What to add to b's coordinates to bring it next to a, across the
+        #   edges of the world if need be.
+        dx = b.location.x-a.location.x
+        dy = b.location.y-a.location.y
+        w,h = self.width,self.height
+        return ((dx+w/2) % w - w/2 - dx,(dy+h/2) % h - h/2 - dy)
     def process_collision(self,a,b,changes):
         d = b.displacement_to(a).normalized
         v = a.heading - b.heading
         impact = d.dot(v)**2
         for x,other,s in [[a,b,+1],[b,a,-1]]:
             if not other.floor_mat:
+                # Being pushed around by something solid wakes you up
+                x.asleep = False
+                x.last_hit = self.clock
                 relative_mass = 1.0 - (0.0 if other.anchored else x.mass/(a.mass+b.mass))
                 if not x.anchored:
                     changes.append([x,s*((d-v*0.1*relative_mass).phi-d.phi),d*(1+abs(v.dot(d)))*s*relative_mass])
@@ -680,14 +1584,109 @@ class World:
         if isinstance(p,Point):  return Point(p.x % w,p.y % h)
         if isinstance(p,Vector): return Vector((p.x+w/2) % w - w/2,(p.y+h/2) % h - h/2)
         return p
+    Result = namedtuple("Result", "name brain owner status age mass finished")
+    def results(self):
+        status = {False:"alive",True:"dead",None:"undead"}
+        return [World.Result(c.name,c.brain_class.__name__,c.brain_class.owner,"finished" if c.finished else status[c.dead],c.age,c.mass,c.finished)
+            for c in self.starting_critters]
+    def host_brains(self):
+        # Swap every critter's brain for a RemoteBrain and start the workers;
+        #   brains that didn't come from a brain file have nothing for a
+        #   worker to load, so they go on thinking here
+        hosted = [c for c in self.critters if c.brain_class.source]
+        for c in hosted:
+            c.brain = RemoteBrain(self.brain_host,c)
+        self.brain_host.start(sorted(set(c.brain.file for c in hosted)))
+    def think_remotely(self):
+        # Each team's senses go out in one batch, and the commands come back
+        #   to wait in the RemoteBrains for their critters' turns.
+        teams = {}
+        for c in self.critters:
+            if not c.dead and isinstance(c.brain,RemoteBrain):
+                c.get_ready()
+                teams.setdefault(c.brain.file,[]).append(c)
+        replies = self.brain_host.think({file:[(c.name,c.brain_class.__name__,c.senses().pack()) for c in team] for file,team in teams.items()})
+        for file,team in teams.items():
+            for c,reply in zip(team,replies[file] or [None]*len(team)):
+                c.brain.reply = reply
+    def think_in_batches(self):
+        # Brain classes with an on_tick_batch decide for all their critters
+        #   here, before anyone moves; the time it takes is split evenly
+        #   between them.
+        classes = {}
+        for c in self.critters:
+            if not c.dead and type(c.brain).on_tick_batch:
+                classes.setdefault(type(c.brain),[]).append(c)
+        for brain,team in classes.items():
+            for c in team: c.get_ready()
+            columns = SenseColumns([c.brain for c in team],[c.senses() for c in team])
+            stream = self.batch_streams.get(brain)
+            if stream is None:
+                stream = self.batch_streams[brain] = self.streams.brain("{}:{}".format(brain.owner,brain.__name__))
+            commands = None
+            previous = Streams.use(stream)
+            wall,cpu = time.perf_counter(),time.process_time()
+            try:
+                commands = list(brain.on_tick_batch(columns))
+                if len(commands) != len(team):
+                    raise ValueError("{}.on_tick_batch gave {} commands for {} critters".format(brain.__name__,len(commands),len(team)))
+            except Exception as e:
+                traceback.print_exc(limit=3)
+                commands = None
+            finally:
+                wall,cpu = time.perf_counter()-wall,time.process_time()-cpu
+                Streams.use(previous)
+            for c,command in zip(team,commands or [None]*len(team)):
+                if commands is None: c.die()
+                c.decided_at,c.decided = self.clock,c.settle(command,wall/len(team),cpu/len(team))
+    def charge(self,critter,wall,cpu):
+        critter.decisions  += 1
+        critter.brain_wall += wall
+        critter.brain_cpu  += cpu
+        cost = self.brain_costs.get(brain_kind(critter))
+        if cost is None:
+            cost = self.brain_costs[brain_kind(critter)] = {'decisions':0,'wall':0.0,'cpu':0.0,'overruns':0}
+        cost['decisions'] += 1
+        cost['wall'] += wall
+        cost['cpu']  += cpu
+    def overspent(self,critter,command):
+        # critter's brain has gone over its time for this tick; returns what
+        #   (if anything) it gets to do about the command it just came up with
+        self.brain_costs[brain_kind(critter)]['overruns'] += 1
+        if self.budget_policy == 'warn':
+            print("%s (%s) took %.1fms of its %.1fms at tick %d" % (critter.name,brain_kind(critter).__name__,1000*critter.spent,1000*self.brain_budget,self.clock))
+            return command
+        elif self.budget_policy == 'kill':
+            critter.die("Zzzzz...")
+        return None
     def print_stats(self):
+        if self.streams.seed is not None:
+            print("Seed:               ",self.streams.seed)
         print("Food remaining: ",sum(f.value for f in self.food))
         print("Brains available:   ",len(Brains.available))
         print("Critters at start:  ",len(self.starting_critters))
         print("Critters remaining: ",len(self.critters))
+        if self.run_time > 0:
+            print("Ticks run:          ",self.clock)
+            print("Ticks per second:    %5.1f" % (self.clock/self.run_time))
+        stats = self.broad_phase_stats
+        if stats['ticks']:
+            print("Pairs per tick:      %5.1f of %d possible (%4.1f%%)" % (
+                stats['candidates']/stats['ticks'],stats['possible']//stats['ticks'],100.0*stats['candidates']/max(1,stats['possible'])))
+            if self.sleep:
+                print("Skipped asleep:      %5.1f" % (stats['slept']/stats['ticks']))
+        if self.senses_offered:
+            print("Senses computed:     "+", ".join("%s %d%%" % (organ,100*self.senses_computed.get(organ,0)//self.senses_offered) for organ in Senses.organs))
+        if Brains.load_times:
+            print("Brain files loaded:  "+", ".join("%s %.1fms%s" % (os.path.basename(file),1000*t," (cached)" if cached else "") for file,t,cached in Brains.load_times))
+        if self.brain_costs:
+            print("Brain costs:               decisions  wall us/decision  cpu us/decision  over budget")
+            for brain,cost in sorted(self.brain_costs.items(),key=lambda bc: -bc[1]['wall']):
+                n = cost['decisions']
+                print("    %-22s %9d %12.1f %16.1f %12d" % ((brain.owner or '')+' '+brain.__name__,n,1e6*cost['wall']/n,1e6*cost['cpu']/n,cost['overruns']))
         for c in sorted(self.starting_critters,key=lambda c: (-(c.finished or self.clock),c.age,c.mass),reverse=True):
             status = ("finished at %5.2f" % (c.finished*self.tick_time)) if c.finished else {False:"alive",True:"%5.2f" % (c.age*self.tick_time),None:"Undead"}[c.dead]
-            print("    %5s %20s %5.1f" % (c.name,status,c.mass))
+            print("    %5s %20s %5.1f %8.1fus/decision" % (c.name,status,c.mass,1e6*c.brain_wall/max(1,c.decisions)))
 
 class WorldView:
     def __init__(self,world,scale):
@@ -724,6 +1723,19 @@ class WorldView:
             self.tk.update_idletasks()
             self.tk.update()
 
+class NullView:
+    # Stands in for WorldView when there's no window (batch runs, servers
+    #   without a display); it draws nothing but keeps the Secretion
+    #   bookkeeping from piling up.
+    def __init__(self,world):
+        self.world = world
+        self.window_open = True
+    def on_tick(self):
+        Secretion.trails += Secretion.undrawn
+        Secretion.undrawn = []
+        Secretion.dead.clear()
+        Secretion.resized.clear()
+
 class Users:
     registered = []
     current = None
@@ -739,14 +1751,201 @@ class Brains:
     registered = {}
     available = []
     codes = None
-    def register(brain_class):
-        u = Users.current
+    loading = None
+    teams = {}          # (user,code) -> brain class, across all codes
+    problems = []       # (file,what's wrong)
+    load_times = []     # (file,seconds,whether the compiled code was cached)
+    compiled = {}       # (path,mtime,hash) -> code object
+    def register(brain_class,owner=None):
+        u = owner or Users.current
+        problem = Brains.check(brain_class,u)
+        if problem:
+            Brains.problems.append((Brains.loading,problem))
+            print("Not using {}: {}".format(getattr(brain_class,'__name__',brain_class),problem))
+            return
+        Brains.teams[(u,brain_class.code)] = brain_class
         if (not Brains.codes) or (brain_class.code == Brains.codes):
             if not u in Brains.registered.keys():
                 Brains.registered[u] = []
             Brains.registered[u].append(brain_class)
             Brains.available.append(brain_class)
-            brain_class.owner = Users.initial
+            brain_class.owner = owner or Users.initial
+            brain_class.source = Brains.loading
+    def adopt(brain_class,owner=''):
+        # A brain class handed straight to build_world rather than loaded
+        #   from a brain file gets checked and an owner like the rest, but
+        #   no source
+        if getattr(brain_class,'owner',None) is not None: return
+        problem = Brains.check(brain_class,owner)
+        if problem:
+            raise ValueError("Can't use {}: {}".format(getattr(brain_class,'__name__',brain_class),problem))
+        Brains.teams[(owner,brain_class.code)] = brain_class
+        brain_class.owner = owner
+        brain_class.source = None
+    def check(brain_class,user):
+        # What (if anything) is wrong with brain_class, before any critter gets it
+        if not (isinstance(brain_class,type) and issubclass(brain_class,CritterBrain)):
+            return "it isn't a CritterBrain"
+        if brain_class.on_tick_batch is not None and not callable(brain_class.on_tick_batch):
+            return "its on_tick_batch can't be called"
+        other = Brains.teams.get((user,brain_class.code))
+        if brain_class.code and other is not None and other.__name__ != brain_class.__name__:
+            return "its code {!r} is already used by {} on the same team".format(brain_class.code,other.__name__)
+    def clear():
+        Brains.registered = {}
+        Brains.available = []
+        Brains.teams = {}
+        Brains.problems = []
+        Brains.load_times = []
+
+def compiled_brains(file):
+    # (code,cached) for a brain file.  The compiled code is kept, by path,
+    #   modification time and a hash of the source, both here and in the
+    #   __pycache__ next to the file, so it's only compiled again when the
+    #   file changes.
+    source = open(file,"rb").read()
+    key = (os.path.abspath(file),os.stat(file).st_mtime,hashlib.sha1(source).hexdigest())
+    if key in Brains.compiled:
+        return Brains.compiled[key],True
+    cache = os.path.join(os.path.dirname(file),'__pycache__','{}.{}.brains'.format(os.path.basename(file),sys.implementation.cache_tag))
+    try:
+        with open(cache,"rb") as f:
+            saved = marshal.load(f)
+        if saved[:3] == key:
+            Brains.compiled[key] = saved[3]
+            return saved[3],True
+    except (OSError,EOFError,ValueError,TypeError,IndexError):
+        pass
+    code = compile(source,file,'exec')
+    Brains.compiled[key] = code
+    try:
+        os.makedirs(os.path.dirname(cache),exist_ok=True)
+        with open(cache,"wb") as f:
+            marshal.dump(key+(code,),f)
+    except OSError:
+        pass
+    return code,False
+
+def load_brains(files=None,codes=None):
+    Brains.codes = codes
+    for file in files or sorted(glob.glob("*_brains.py")):
+        match = re.search('^(.+)_brains.py$', os.path.basename(file))
+        if match:
+            Users.register(match.group(1))
+            Brains.loading = file
+            start = time.perf_counter()
+            cached = False
+            try:
+                code,cached = compiled_brains(file)
+                exec(code,globals())
+            except Exception as e:
+                Brains.problems.append((file,"{}: {}".format(type(e).__name__,e)))
+                traceback.print_exception(*sys.exc_info(),limit=1)
+            Brains.load_times.append((file,time.perf_counter()-start,cached))
+    return Brains.available
+
+class Config:
+    # Everything needed to set up a match; the command line just fills one of these in.
+    tick_time  = 0.1
+    tick_limit = -1
+    critters   = 10
+    food       = 100
+    pits       = 0
+    stars      = 0
+    blocks     = 0
+    warn       = False
+    zombies    = False
+    stop_count = None
+    headless   = False
+    free_run   = False
+    array_physics = False
+    smell      = False
+    sleep      = False
+    batched_sight = False
+    brain_budget  = None
+    budget_policy = 'warn'
+    brain_host    = False
+    brain_timeout = 1.0
+    seed       = None
+    sight_bins = Critter.sight_bins
+    max_sounds = Critter.max_sounds
+    lod_bands  = Critter.lod_bands
+    show_senses = True
+    metabolic_cost    = 0.01
+    movement_cost     = 0.1
+    acceleration_cost = 40
+    collision_cost    = 10
+    def __init__(self,**settings):
+        for k,v in settings.items():
+            if not hasattr(Config,k):
+                raise TypeError("Unknown setting: {}".format(k))
+            setattr(self,k,v)
+
+def build_world(config,brains=None):
+    brains = brains or Brains.available
+    if not brains:
+        raise ValueError("No brains available!")
+    for brain_class in brains:
+        Brains.adopt(brain_class)
+    Critter.metabolic_cost     = config.metabolic_cost
+    Critter.movement_cost      = config.movement_cost
+    Critter.acceleration_cost  = config.acceleration_cost
+    PhysicalObject.collision_cost  = config.collision_cost
+    Critter.sight_bins         = config.sight_bins
+    Critter.max_sounds         = config.max_sounds
+    Critter.lod_bands          = config.lod_bands
+    w = World(
+        tick_time  = config.tick_time,
+        tick_limit = config.tick_limit,
+        food       = config.food,
+        pits       = config.pits,
+        stars      = config.stars,
+        blocks     = config.blocks,
+        warn       = config.warn,
+        zombies    = config.zombies,
+        stop_count = config.stop_count,
+        headless   = config.headless,
+        free_run   = config.free_run,
+        array_physics = config.array_physics,
+        smell      = config.smell,
+        sleep      = config.sleep,
+        batched_sight = config.batched_sight,
+        brain_budget  = config.brain_budget,
+        budget_policy = config.budget_policy,
+        brain_host    = config.brain_host,
+        brain_timeout = config.brain_timeout,
+        seed       = config.seed,
+        show_senses = config.show_senses
+        )
+    Streams.use(w.streams.world)
+    critter_class = BodyCritter if config.array_physics else Critter
+    for i in range(1,config.critters+1):
+        c = critter_class(w,brains[i % len(brains)],i)
+        #For race
+        #c.heading = Heading(0)
+        #c.location = Point(10,(i+0.5)*w.height/(config.critters+1))
+        #For maze
+        c.location = Point((w.width/12)*(randrange(0,12)+0.25),(w.height/6)*(randrange(0,6)+0.25))
+    # [Critter(w,Brains.available[i % len(Brains.available)],i) for i in range(1,config.critters+1)]
+    # [Critter(w,choice(Brains.available),i) for i in range(1,config.critters+1)]
+    if w.brain_host:
+        w.host_brains()
+    return w
+
+def run_match(config,brains=None,ticks=None):
+    w = build_world(config,brains)
+    if ticks is None:
+        w.run()
+    else:
+        w.step(ticks)
+    return w.results()
+
+def lod_bands(text):
+    # "20:24,40:8" -> ((20.0,24),(40.0,8))
+    try:
+        return tuple((float(d),int(b)) for d,b in (band.split(':') for band in text.split(',') if band))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected distance:bins,... not {}".format(text))
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-t', default=0.1, type=float)
@@ -764,61 +1963,69 @@ parser.add_argument('--acceleration_cost',  default = 40,   type=float)
 parser.add_argument('--collision_cost',     default = 10,   type=float)
 parser.add_argument('--stop_count',         default = None, type=int)
 parser.add_argument('--codes')
+parser.add_argument('--headless',           default=False, action='store_true')
+parser.add_argument('--free_run',           default=False, action='store_true')
+parser.add_argument('--array_physics',      default=False, action='store_true')
+parser.add_argument('--brain_budget',       default=None, type=float,
+    help="seconds of brain time each critter gets per tick")
+parser.add_argument('--budget_policy',      default='warn', choices=World.budget_policies)
+parser.add_argument('--brain_host',         default=False, action='store_true',
+    help="run each brain file's brains in a worker process of its own")
+parser.add_argument('--brain_timeout',      default=1.0, type=float)
+parser.add_argument('--batched_sight',      default=False, action='store_true')
+parser.add_argument('--smell',              default=False, action='store_true')
+parser.add_argument('--sleep',              default=False, action='store_true',
+    help="skip collision checks between stopped critters and walls")
+parser.add_argument('--seed',               default=None, type=int)
+parser.add_argument('--sight_bins',         default=Critter.sight_bins, type=int)
+parser.add_argument('--lod_bands',          default=Critter.lod_bands, type=lod_bands,
+    help='distance:bins,... e.g. 20:24,40:8')
+parser.add_argument('--max_sounds',         default=Critter.max_sounds, type=int)
+parser.add_argument('--hide_senses',        default=False, action='store_true')
 parser.add_argument('files', nargs=argparse.REMAINDER)
 
-cmd = parser.parse_args()
-
-Critter.metabolic_cost     = cmd.metabolic_cost
-Critter.movement_cost      = cmd.movement_cost
-Critter.acceleration_cost  = cmd.acceleration_cost
-PhysicalObject.collision_cost  = cmd.collision_cost
-Brains.codes = cmd.codes
-
-import atexit
-import glob,re
-
+def main(argv=None):
+    cmd = parser.parse_args(argv)
+    config = Config(
+        tick_time  = cmd.t,
+        tick_limit = cmd.n,
+        critters   = cmd.c,
+        food       = cmd.f,
+        pits       = cmd.p,
+        stars      = cmd.s,
+        blocks     = cmd.b,
+        warn       = cmd.w,
+        zombies    = cmd.z,
+        stop_count = cmd.stop_count,
+        headless   = cmd.headless,
+        free_run   = cmd.free_run,
+        array_physics = cmd.array_physics,
+        smell      = cmd.smell,
+        sleep      = cmd.sleep,
+        batched_sight = cmd.batched_sight,
+        brain_budget  = cmd.brain_budget,
+        budget_policy = cmd.budget_policy,
+        brain_host    = cmd.brain_host,
+        brain_timeout = cmd.brain_timeout,
+        seed       = cmd.seed,
+        sight_bins = cmd.sight_bins,
+        max_sounds = cmd.max_sounds,
+        lod_bands  = cmd.lod_bands,
+        show_senses = not cmd.hide_senses,
+        metabolic_cost    = cmd.metabolic_cost,
+        movement_cost     = cmd.movement_cost,
+        acceleration_cost = cmd.acceleration_cost,
+        collision_cost    = cmd.collision_cost
+        )
+    if not load_brains(cmd.files,cmd.codes):
+        print("No brains available!")
+        return
+    w = build_world(config)
+    atexit.register(w.print_stats)
+    try:
+        w.run()
+    except KeyboardInterrupt:
+        pass
 
-for file in cmd.files or glob.glob("*_brains.py"):
-    match = re.search('^(.+)_brains.py$', file)
-    if match:
-        Users.register(match.group(1))
-        try:
-            exec(compile(open(file, "r").read(), file, 'exec'))
-        except Exception as e:
-            traceback.print_exception(*sys.exc_info(),limit=1)
-
-if not Brains.available:
-    print("No brains available!")
-    exit()
-
-w = World(
-    tick_time  = cmd.t,
-    tick_limit = cmd.n,
-    food       = cmd.f,
-    pits       = cmd.p,
-    stars      = cmd.s,
-    blocks     = cmd.b,
-    warn       = cmd.w,
-    zombies    = cmd.z,
-    stop_count = cmd.stop_count
-    )
-
-@atexit.register
-def show_stats():
-    global w
-    w.print_stats()
-
-for i in range(1,cmd.c+1):
-    c = Critter(w,Brains.available[i % len(Brains.available)],i)
-    #For race
-    #c.heading = Heading(0)
-    #c.location = Point(10,(i+0.5)*w.height/(cmd.c+1))
-    #For maze
-    c.location = Point((200/12)*(randrange(0,12)+0.25),(100/6)*(randrange(0,6)+0.25))
-    
-# [Critter(w,Brains.available[i % len(Brains.available)],i) for i in range(1,cmd.c+1)]
-# [Critter(w,choice(Brains.available),i) for i in range(1,cmd.c+1)]
-try:
-    w.run()
-except KeyboardInterrupt:
-    pass
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#
+#
+from math import pi,ceil,floor
+
+def depth_buffer(spans,bins,low=-1.0,high=1.0,background=None,far=float("inf")):
+    # An approximate alternative to melding AngularIntervalSets front to back.
+    #   spans are (distance,left,right,thing) with angles taken modulo 2 pi;
+    #   the low..high field of view is cut into bins, each bin keeps the
+    #   nearest thing whose span covers its middle, and runs of bins with the
+    #   same thing are returned as (thing,distance,left,right).  Anything
+    #   narrower than a bin still gets the bin its middle falls in.
+    width = (high-low)/bins
+    depth = [far]*bins
+    owner = [background]*bins
+    for dist,left,right,thing in spans:
+        if dist >= far: continue
+        for shift in (0.0,2*pi,-2*pi):
+            a,b = left+shift,right+shift
+            if b < low or a > high: continue
+            first = max(0,int(ceil((a-low)/width-0.5)))
+            last  = min(bins-1,int(floor((b-low)/width-0.5)))
+            if first > last:
+                middle = (a+b)/2
+                if not (low <= middle <= high): continue
+                first = last = min(bins-1,int((middle-low)/width))
+            for i in range(first,last+1):
+                if dist < depth[i]:
+                    depth[i] = dist
+                    owner[i] = thing
+    runs = []
+    start = 0
+    for i in range(1,bins+1):
+        if i == bins or owner[i] is not owner[start]:
+            runs.append((owner[start],depth[start],low+start*width,low+i*width))
+            start = i
+    return runs
+
+assert depth_buffer([],4,background="sky",far=10) == [("sky",10,-1.0,1.0)]
+assert depth_buffer([(5,-2,0,"a")],4,background="sky",far=10) == [("a",5,-1.0,0.0),("sky",10,0.0,1.0)]
+assert depth_buffer([(5,-2,0,"a"),(3,-0.4,0.4,"b")],4,background="sky",far=10) == [("a",5,-1.0,-0.5),("b",3,-0.5,0.5),("sky",10,0.5,1.0)]
+assert depth_buffer([(5,-0.1,0.1,"a")],4,background="sky",far=10) == [("sky",10,-1.0,0.0),("a",5,0.0,0.5),("sky",10,0.5,1.0)]
+assert depth_buffer([(5,2*pi-0.5,2*pi+0.5,"a")],4,background="sky",far=10) == [("sky",10,-1.0,-0.5),("a",5,-0.5,0.5),("sky",10,0.5,1.0)]
+assert depth_buffer([(20,-1,1,"a")],4,background="sky",far=10) == [("sky",10,-1.0,1.0)]
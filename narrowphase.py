@@ -0,0 +1,119 @@
+#
+#
+class Shape:
+    # An outline boiled down to flat coordinate lists plus what the overlap
+    #   test needs (bounding box, convexity, edge normals), so that it can be
+    #   worked out once and then tested against any number of other shapes.
+    def __init__(self,outline):
+        self.xs = [float(p[0]) for p in outline]
+        self.ys = [float(p[1]) for p in outline]
+        self.n  = len(outline)
+        self.left,self.right = min(self.xs),max(self.xs)
+        self.bottom,self.top = min(self.ys),max(self.ys)
+        self.convex = is_convex(self.xs,self.ys)
+        self._axes = None
+    def axes(self):
+        # Edge normals (not normalized; that doesn't matter for separation)
+        if self._axes is None:
+            xs,ys,n = self.xs,self.ys,self.n
+            self._axes = [(ys[i]-ys[i-1],xs[i-1]-xs[i]) for i in range(0,n)]
+        return self._axes
+    def contains(self,x,y):
+        # Even-odd ray casting
+        xs,ys = self.xs,self.ys
+        inside = False
+        j = self.n-1
+        for i in range(0,self.n):
+            if (ys[i] > y) != (ys[j] > y) and x < xs[i]+(y-ys[i])*(xs[j]-xs[i])/(ys[j]-ys[i]):
+                inside = not inside
+            j = i
+        return inside
+
+def is_convex(xs,ys):
+    n = len(xs)
+    if n < 4: return True
+    sign = 0
+    for i in range(0,n):
+        x0,y0 = xs[i-2],ys[i-2]
+        x1,y1 = xs[i-1],ys[i-1]
+        x2,y2 = xs[i],ys[i]
+        cross = (x1-x0)*(y2-y1)-(y1-y0)*(x2-x1)
+        if cross != 0:
+            if sign == 0:
+                sign = 1 if cross > 0 else -1
+            elif (cross > 0) != (sign > 0):
+                return False
+    return True
+
+def separated(s1,s2,dx,dy):
+    # Is there an edge normal of s1 along which s1 and (s2 moved by dx,dy)
+    #   don't overlap?  Only meaningful as a proof of separation if s1 is convex.
+    xs1,ys1,xs2,ys2 = s1.xs,s1.ys,s2.xs,s2.ys
+    for ax,ay in s1.axes():
+        lo1 = hi1 = xs1[0]*ax+ys1[0]*ay
+        for i in range(1,s1.n):
+            p = xs1[i]*ax+ys1[i]*ay
+            if p < lo1: lo1 = p
+            elif p > hi1: hi1 = p
+        offset = dx*ax+dy*ay
+        lo2 = hi2 = xs2[0]*ax+ys2[0]*ay+offset
+        for i in range(1,s2.n):
+            p = xs2[i]*ax+ys2[i]*ay+offset
+            if p < lo2: lo2 = p
+            elif p > hi2: hi2 = p
+        if hi1 < lo2 or hi2 < lo1:
+            return True
+    return False
+
+def edges_cross(s1,s2,dx,dy):
+    xs1,ys1,xs2,ys2 = s1.xs,s1.ys,s2.xs,s2.ys
+    # Only edges of s2 that reach into s1's box can cross any edge of s1
+    near = []
+    for j in range(0,s2.n):
+        bx,by = xs2[j-1]+dx,ys2[j-1]+dy
+        cx,cy = xs2[j]+dx,ys2[j]+dy
+        if max(bx,cx) >= s1.left and min(bx,cx) <= s1.right and max(by,cy) >= s1.bottom and min(by,cy) <= s1.top:
+            near.append((bx,by,cx,cy))
+    if not near: return False
+    for i in range(0,s1.n):
+        px,py = xs1[i-1],ys1[i-1]
+        qx,qy = xs1[i],ys1[i]
+        ex,ey = qx-px,qy-py
+        for bx,by,cx,cy in near:
+            d1 = ex*(by-py)-ey*(bx-px)
+            d2 = ex*(cy-py)-ey*(cx-px)
+            if (d1 > 0 and d2 > 0) or (d1 < 0 and d2 < 0): continue
+            fx,fy = cx-bx,cy-by
+            d3 = fx*(py-by)-fy*(px-bx)
+            d4 = fx*(qy-by)-fy*(qx-bx)
+            if (d3 > 0 and d4 > 0) or (d3 < 0 and d4 < 0): continue
+            if d1 == d2 == 0 and d3 == d4 == 0:
+                # Collinear; they only touch if their extents overlap
+                if max(px,qx) < min(bx,cx) or max(bx,cx) < min(px,qx): continue
+                if max(py,qy) < min(by,cy) or max(by,cy) < min(py,qy): continue
+            return True
+    return False
+
+def overlap(s1,s2,dx=0.0,dy=0.0):
+    # Do shapes s1 and s2 (with s2 moved by dx,dy) overlap?  Cheapest tests
+    #   first, returning as soon as anything settles it.
+    if s1.left > s2.right+dx or s2.left+dx > s1.right or s1.bottom > s2.top+dy or s2.bottom+dy > s1.top:
+        return False
+    if s1.convex and s2.convex:
+        return not (separated(s1,s2,dx,dy) or separated(s2,s1,-dx,-dy))
+    if edges_cross(s1,s2,dx,dy):
+        return True
+    # No edges cross, so either one is inside the other or they're apart
+    return s2.contains(s1.xs[0]-dx,s1.ys[0]-dy) or s1.contains(s2.xs[0]+dx,s2.ys[0]+dy)
+
+square  = Shape([(0,0),(2,0),(2,2),(0,2)])
+diamond = Shape([(3,1),(4,0),(5,1),(4,2)])
+notch   = Shape([(0,0),(4,0),(4,4),(2,1),(0,4)])
+assert square.convex and not notch.convex
+assert square.contains(1,1) and not square.contains(3,1)
+assert not overlap(square,diamond)
+assert overlap(square,diamond,-1.5,0)
+assert overlap(square,Shape([(0.5,0.5),(1,0.5),(1,1)]))
+assert overlap(Shape([(0.5,0.5),(1,0.5),(1,1)]),square)
+assert not overlap(notch,Shape([(1.8,2),(2.2,2),(2,3)]))
+assert overlap(notch,Shape([(1.8,0.5),(2.2,0.5),(2,3)]))
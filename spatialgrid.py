@@ -0,0 +1,69 @@
+#
+#
+import math
+
+class SpatialGrid:
+    # A uniform grid of buckets laid over a torus of the given size; objects
+    #   are filed by a point (normally their location) and can be looked up
+    #   by the rectangle around a point they might be found in.
+    def __init__(self,width,height,cell_width,cell_height):
+        self.width  = width
+        self.height = height
+        # Stretch the cells so that a whole number of them tiles the torus
+        self.cols = max(1,int(width//cell_width))
+        self.rows = max(1,int(height//cell_height))
+        self.cell_width  = width/self.cols
+        self.cell_height = height/self.rows
+        self.cells = [set() for i in range(0,self.cols*self.rows)]
+        self.where = {}
+    def cell_at(self,x,y):
+        return (int(x//self.cell_width) % self.cols)*self.rows + (int(y//self.cell_height) % self.rows)
+    def insert(self,obj,x,y):
+        self.move(obj,x,y)
+    def move(self,obj,x,y):
+        # Returns True if obj changed cells (or was new to the grid)
+        cell = self.cell_at(x,y)
+        old = self.where.get(obj)
+        if old == cell:
+            return False
+        if old is not None:
+            self.cells[old].discard(obj)
+        self.cells[cell].add(obj)
+        self.where[obj] = cell
+        return True
+    def remove(self,obj):
+        cell = self.where.pop(obj,None)
+        if cell is not None:
+            self.cells[cell].discard(obj)
+    def __contains__(self,obj):
+        return obj in self.where
+    def __len__(self):
+        return len(self.where)
+    def span(self,v,size,count,reach):
+        # The (wrapped, distinct) cell indices within reach of v along one axis
+        n = int(math.ceil(reach/size))
+        if 2*n+1 >= count:
+            return range(0,count)
+        i = int(v//size)
+        return [j % count for j in range(i-n,i+n+1)]
+    def cells_near(self,x,y,reach_x,reach_y):
+        rows = self.rows
+        ys = self.span(y,self.cell_height,rows,reach_y)
+        return [self.cells[i*rows+j] for i in self.span(x,self.cell_width,self.cols,reach_x) for j in ys]
+    def near(self,x,y,reach_x,reach_y):
+        # Everything filed within (at least) reach_x, reach_y of (x,y); callers
+        #   still need to do their own exact distance test.
+        for cell in self.cells_near(x,y,reach_x,reach_y):
+            yield from cell
+
+g = SpatialGrid(100,100,10,10)
+g.insert("a",5,5)
+g.insert("b",95,95)
+g.insert("c",50,50)
+assert set(g.near(1,1,10,10)) == {"a","b"}
+assert not g.move("a",6,6)
+assert g.move("a",15,5)
+assert set(g.near(50,50,10,10)) == {"c"}
+g.remove("c")
+assert set(g.near(50,50,10,10)) == set()
+assert len(SpatialGrid(100,50,40,40).cells) == 2
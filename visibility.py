@@ -0,0 +1,65 @@
+#
+#
+from math import pi,atan2,hypot,ceil,floor,sqrt
+
+class VisibilityIndex:
+    # For walls that never move or change, works out (once per small cell of
+    #   the world, the first time an eye is in it) which of them can't
+    #   possibly be seen from anywhere in that cell, so sight needn't bother
+    #   projecting them.  To be safe for every eye in the cell, walls are
+    #   shrunk by the cell's radius when they hide things and grown by it
+    #   when they're the ones that might be hidden.
+    def __init__(self,walls,width,height,cell_size,horizon,bins=360):
+        self.walls   = [(w.location.x,w.location.y,w.radius(),w) for w in walls]
+        self.indexed = frozenset(w for x,y,r,w in self.walls)
+        self.width   = width
+        self.height  = height
+        self.cols    = max(1,int(width//cell_size))
+        self.rows    = max(1,int(height//cell_size))
+        self.cell_width  = width/self.cols
+        self.cell_height = height/self.rows
+        self.slack   = sqrt(self.cell_width**2+self.cell_height**2)/2
+        self.horizon = horizon
+        self.bins    = bins
+        self.visible = {}
+    def visible_from(self,x,y):
+        key = (int(x//self.cell_width) % self.cols,int(y//self.cell_height) % self.rows)
+        if not key in self.visible:
+            self.visible[key] = self.find_visible((key[0]+0.5)*self.cell_width,(key[1]+0.5)*self.cell_height)
+        return self.visible[key]
+    def find_visible(self,x,y):
+        w,h,slack,bins = self.width,self.height,self.slack,self.bins
+        bin_width = 2*pi/bins
+        visible = set()
+        nearby = []
+        for wx,wy,r,wall in self.walls:
+            dx = (wx-x+w/2) % w - w/2
+            dy = (wy-y+h/2) % h - h/2
+            dist = hypot(dx,dy)
+            if dist-r-slack < self.horizon:
+                nearby.append((dist,atan2(dy,dx),r,wall))
+            # else it's lost in the distance
+        depth = [float("inf")]*bins
+        for dist,a,r,wall in nearby:
+            r -= slack
+            if r <= 0 or dist-r <= 2*slack: continue
+            near = dist-r
+            da = atan2(r,near)
+            # only bins it covers completely
+            first = int(ceil((a-da+pi)/bin_width))
+            last  = int(floor((a+da+pi)/bin_width))-1
+            for i in range(first,last+1):
+                if near < depth[i % bins]: depth[i % bins] = near
+        for dist,a,r,wall in nearby:
+            r += slack
+            near = dist-r
+            if near <= 0:
+                visible.add(wall)
+                continue
+            da = atan2(r,near)
+            # any bin it touches
+            first = int(floor((a-da+pi)/bin_width))
+            last  = int(floor((a+da+pi)/bin_width))
+            if any(depth[i % bins] > near for i in range(first,last+1)):
+                visible.add(wall)
+        return frozenset(visible)